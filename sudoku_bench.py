@@ -0,0 +1,255 @@
+# sudoku_bench.py
+
+# Benchmarks for the engine: solving, puzzle generation and checking moves
+# with Grid.place(), each run against fixed corpora built from a seed so two
+# runs measure the same work. Results can be saved as JSON and compared with
+# an earlier run to catch regressions.
+import json
+import platform
+import random
+import time
+import tracemalloc
+
+from sudoku_core import (ROWS, COLUMNS, EASY, HARD, FAMILY_SIZE, Grid, valid, solve, set_engine,
+                         generate_puzzle, base_puzzle, seeded_puzzle, transform_puzzle, parse_puzzle, format_puzzle)
+import sudoku_core
+
+# Constants
+# Seed the corpora are built from unless another one is given.
+BENCH_SEED = 2024
+# Puzzles in each corpus.
+CORPUS_SIZE = 20
+# A proven 17-clue puzzle, the fewest clues a sudoku with a single solution can have.
+MINIMAL_PUZZLE = "000000010400000000020000000000050407008000300001090000300400200050100000000806000"
+# Puzzles known to be among the hardest for backtracking solvers.
+HARDEST_PUZZLES = [
+    # Arto Inkala's 2012 "world's hardest sudoku".
+    "8..........36......7..9.2...5...7.......457.....1...3...1....68..85...1..9....4..",
+    # AI Escargot.
+    "1....7.9..3..2...8..96..5....53..9...1..8...26....4...3......1..4......7..7...3..",
+    # Easter Monster.
+    "1.......2.9.4...5...6...7...5.9.3.......7.......85..4.7.....6...3...9.8...2.....1",
+]
+# Clues for the open-ended puzzles of the placement benchmark, which have
+# many solutions so placing a move has to search for one.
+OPEN_CLUES = 12
+# Times each puzzle is run, keeping the best.
+REPEAT = 3
+# How much slower a benchmark may get, as a fraction, before a comparison
+# with an earlier run counts it as a regression.
+TOLERANCE = 0.25
+# Latency percentiles reported for each benchmark.
+PERCENTILES = [50, 90, 99]
+
+
+# Returns a copy of the puzzle line with its symmetry shuffled, see
+# transform_puzzle(). The copy is just as hard as the original.
+def shuffle_puzzle(line, rng):
+    board = parse_puzzle(line)
+    return format_puzzle(transform_puzzle(board, board, rng)[0])
+
+
+# Returns the benchmark corpora for a seed, as a dict of corpus name to a
+# list of puzzle lines: freshly generated easy puzzles, shuffled copies of
+# the 17-clue puzzle and shuffled copies of the hardest puzzles, plus the
+# open-ended puzzles as (puzzle line, solution line) pairs. Puzzle k of a
+# generated corpus is generated from seed + k, so every run, and every
+# repeat within a run, works on the same puzzles.
+def build_corpora(seed=BENCH_SEED, size=CORPUS_SIZE):
+    rng = random.Random(seed)
+    return {
+        "easy": [format_puzzle(generate_puzzle(EASY, ROWS, random.Random(seed + k))[0]) for k in range(size)],
+        "minimal": [shuffle_puzzle(MINIMAL_PUZZLE, rng) for _ in range(size)],
+        "hardest": [shuffle_puzzle(HARDEST_PUZZLES[k % len(HARDEST_PUZZLES)], rng) for k in range(size)],
+        "open": [tuple(map(format_puzzle, generate_puzzle(OPEN_CLUES, ROWS, random.Random(seed + k))))
+                 for k in range(size)],
+    }
+
+
+# Benchmark: solves each puzzle. Returns the list of functions to time.
+def solve_jobs(lines):
+    jobs = []
+    for line in lines:
+        def job(board=parse_puzzle(line)):
+            if not solve([row[:] for row in board]):
+                raise RuntimeError("benchmark puzzle could not be solved: " + line)
+        jobs.append(job)
+    return jobs
+
+
+# Benchmark: builds a Grid, generating a new puzzle with the given clues.
+# Job k generates from its own random.Random(seed + k), so each run of it
+# generates the same puzzle.
+def generate_jobs(clues, count, seed):
+    return [lambda seed=seed + k: Grid(ROWS, COLUMNS, ROWS, ROWS, clues,
+                                       generate_puzzle(clues, ROWS, random.Random(seed)))
+            for k in range(count)]
+
+
+# Benchmark: builds a Grid from a seeded puzzle with the given clues, the
+# puzzle derived from a base puzzle by seeded_puzzle() rather than searched
+# for. The base puzzles of the seeds' families are generated up front,
+# outside the timing.
+def seeded_jobs(clues, count, seed):
+    for family in range(seed // FAMILY_SIZE, (seed + count - 1) // FAMILY_SIZE + 1):
+        base_puzzle(clues, ROWS, family)
+    return [lambda seed=seed + k: Grid(ROWS, COLUMNS, ROWS, ROWS, clues, seeded_puzzle(seed, clues))
+            for k in range(count)]
+
+
+# Benchmark: places the answer of every empty cell of each puzzle with
+# Grid.place(), after one wrong value. An open-ended puzzle is also given a
+# move that is valid but not in its current solution, when there is one, so
+# place() has to search for a new solution.
+def place_jobs(puzzles):
+    jobs = []
+    for board, solution in puzzles:
+        def job(board=board, solution=solution):
+            grid = Grid(ROWS, COLUMNS, ROWS, ROWS, sum(num != 0 for row in board for num in row),
+                        ([row[:] for row in board], [row[:] for row in solution]))
+            # The same board as a 2-D list, to look for valid wrong values on.
+            rows = grid.board.rows()
+            for row in range(ROWS):
+                for col in range(COLUMNS):
+                    if grid.board[row, col] != 0:
+                        continue
+                    grid.select(row, col)
+                    others = [num for num in range(1, ROWS + 1)
+                              if num != grid.solution[row, col] and valid(rows, num, row, col)]
+                    if others:
+                        grid.place(others[0])
+                    if grid.board[row, col] == 0:
+                        grid.place(grid.solution[row, col])
+                    rows[row][col] = grid.board[row, col]
+        jobs.append(job)
+    return jobs
+
+
+# Returns the benchmarks as a dict of name to a function that sets one up,
+# returning the list of functions to time, each on its own as one puzzle.
+def build_benchmarks(seed=BENCH_SEED, size=CORPUS_SIZE):
+    corpora = build_corpora(seed, size)
+    return {
+        "solve/easy": lambda: solve_jobs(corpora["easy"]),
+        "solve/minimal": lambda: solve_jobs(corpora["minimal"]),
+        "solve/hardest": lambda: solve_jobs(corpora["hardest"]),
+        "generate/easy": lambda: generate_jobs(EASY, size, seed),
+        "generate/hard": lambda: generate_jobs(HARD, size, seed),
+        "generate/seeded": lambda: seeded_jobs(HARD, size, seed),
+        "place/unique": lambda: place_jobs([(parse_puzzle(line), solved_board(line)) for line in corpora["easy"]]),
+        "place/open": lambda: place_jobs([(parse_puzzle(line), parse_puzzle(solution))
+                                          for line, solution in corpora["open"]]),
+    }
+
+
+# Returns the solution of a puzzle line.
+def solved_board(line):
+    board = parse_puzzle(line)
+    solve(board)
+    return board
+
+
+# Returns the pth percentile of a sorted list of numbers, interpolating
+# between the two nearest values.
+def percentile(values, p):
+    position = (len(values) - 1) * p / 100
+    low = int(position)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (position - low)
+
+
+# Times every job of a benchmark, keeping the best of repeat runs of each
+# so that noise from the rest of the machine mostly drops out, then runs
+# them once more under tracemalloc for their peak memory use. Returns the
+# stats as a dict.
+def run_benchmark(jobs, repeat=REPEAT):
+    latencies = []
+    for job in jobs:
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            job()
+            elapsed = time.perf_counter() - start
+            if best is None or elapsed < best:
+                best = elapsed
+        latencies.append(best)
+    latencies.sort()
+    total = sum(latencies)
+
+    tracemalloc.start()
+    for job in jobs:
+        job()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    stats = {"count": len(latencies), "puzzles_per_sec": len(latencies) / total if total else 0.0}
+    for p in PERCENTILES:
+        stats["p" + str(p) + "_ms"] = percentile(latencies, p) * 1000
+    stats["max_ms"] = latencies[-1] * 1000
+    stats["peak_kb"] = peak / 1024
+    return stats
+
+
+# Runs every benchmark with the chosen engine. Returns the report as a dict
+# holding the settings it was run with and the stats of each benchmark.
+def run_benchmarks(engine=None, seed=BENCH_SEED, size=CORPUS_SIZE, repeat=REPEAT, only=None):
+    previous = sudoku_core.current_engine
+    set_engine(engine)
+    try:
+        benchmarks = build_benchmarks(seed, size)
+        results = {}
+        for name, setup in benchmarks.items():
+            if only and not any(name.startswith(prefix) for prefix in only):
+                continue
+            jobs = setup()
+            results[name] = run_benchmark(jobs, repeat)
+    finally:
+        set_engine(previous)
+    return {
+        "engine": engine or "auto",
+        "seed": seed,
+        "size": size,
+        "repeat": repeat,
+        "python": platform.python_version(),
+        "results": results,
+    }
+
+
+# Compares a report against an earlier baseline report. Returns a list of
+# messages, one for each benchmark whose median latency or throughput got
+# worse by more than the tolerance.
+def compare_reports(report, baseline, tolerance=TOLERANCE):
+    regressions = []
+    for name, stats in report["results"].items():
+        old = baseline.get("results", {}).get(name)
+        if not old:
+            continue
+        if stats["p50_ms"] > old["p50_ms"] * (1 + tolerance):
+            regressions.append(name + ": median " + format(old["p50_ms"], ".3f") + " ms -> "
+                               + format(stats["p50_ms"], ".3f") + " ms")
+        if stats["puzzles_per_sec"] < old["puzzles_per_sec"] * (1 - tolerance):
+            regressions.append(name + ": " + format(old["puzzles_per_sec"], ".1f") + " puzzles/s -> "
+                               + format(stats["puzzles_per_sec"], ".1f") + " puzzles/s")
+    return regressions
+
+
+# Returns the report as a table, one line per benchmark.
+def format_report(report):
+    columns = ["puzzles_per_sec"] + ["p" + str(p) + "_ms" for p in PERCENTILES] + ["max_ms", "peak_kb"]
+    lines = ["engine " + report["engine"] + ", seed " + str(report["seed"]) + ", python " + report["python"],
+             "benchmark".ljust(18) + "".join(column.rjust(16) for column in columns)]
+    for name, stats in report["results"].items():
+        lines.append(name.ljust(18) + "".join(format(stats[column], ".3f").rjust(16) for column in columns))
+    return "\n".join(lines)
+
+
+# Saves a report as JSON.
+def save_report(report, path):
+    with open(path, "w") as file:
+        json.dump(report, file, indent=2)
+
+
+# Loads a report saved by save_report().
+def load_report(path):
+    with open(path) as file:
+        return json.load(file)
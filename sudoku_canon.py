@@ -0,0 +1,361 @@
+# sudoku_canon.py
+
+# Canonical forms of puzzles under the symmetries of sudoku: relabelling the
+# numbers, reordering bands, stacks, and the rows and columns within them,
+# and transposing. Every puzzle has a single canonical form shared by all
+# of its equivalent copies, so copies can be found and thrown out of a pack,
+# and a solution found for one copy can be mapped back to any other, which
+# the solve cache below uses.
+from functools import lru_cache
+from itertools import permutations, product
+from math import factorial, isqrt
+
+from sudoku_core import count_solutions, solve
+
+# Constants
+# Most tied ways of arranging the board kept at once while looking for its
+# canonical form. Boards with more symmetry than this, like nearly blank
+# ones, get no canonical form, and are cached as they are.
+MAX_TIED = 2048
+# Number of puzzles the solve cache remembers, least recently used first out.
+CACHE_SIZE = 1024
+# Stands in for a number that hasn't been relabelled yet when ordering the
+# parts of a row, since it gets a label after all the ones given so far.
+NEW = 1 << 16
+
+
+# Returns the canonical form of a board as (canonical board, transform),
+# or None if the board has too much symmetry to work it out, see MAX_TIED.
+# The canonical board is the smallest of all the equivalent copies of the
+# board, compared row by row with empty cells smallest and the numbers
+# relabelled in order of first appearance. The transform turns the board
+# into it, see apply_transform().
+#
+# The copy is built one output row at a time, keeping every arrangement
+# that ties for the smallest rows so far. Columns and stacks that have been
+# empty in every row so far can't be told apart yet, so they are kept as
+# unordered groups instead of trying all their orders. A complete grid
+# starts with its first two rows from complete_states() instead.
+def canonical_form(board):
+    size = len(board)
+    box_size = isqrt(size)
+    stacks = tuple(range(box_size))
+    grids = (board, [list(col) for col in zip(*board)])
+    # A state is (transpose, rows, slots, mapping): the original rows picked
+    # for the output rows so far, the column slots (see arrange()) and the
+    # labels given to the numbers seen so far.
+    if all(all(row) for row in board):
+        states = complete_states(grids, box_size)
+        if states is None:
+            return None
+    else:
+        states = [(transpose, (), ((stacks, None),), {}) for transpose in (0, 1)]
+    for depth in range(len(states[0][1]), size):
+        best = None
+        tied = []
+        for state in states:
+            transpose, rows, slots, mapping = state
+            grid = grids[transpose]
+            for row in next_rows(rows, box_size):
+                key = row_key(grid[row], slots, mapping, box_size)
+                if best is None or key < best:
+                    best = key
+                    tied = []
+                if key == best:
+                    tied.append((state, row))
+        states = []
+        for (transpose, rows, slots, mapping), row in tied:
+            for slots_after, mapping_after in arrange(grids[transpose][row], slots, mapping, box_size):
+                states.append((transpose, rows + (row,), slots_after, mapping_after))
+            if len(states) > MAX_TIED:
+                return None
+    transpose, rows, slots, mapping = states[0]
+    cols = [col for stack_cols in slot_columns(slots, box_size) for col in stack_cols]
+    relabel = [0] * (size + 1)
+    unused = iter(num for num in range(1, size + 1) if num not in mapping)
+    for label in range(len(mapping) + 1, size + 1):
+        mapping[next(unused)] = label
+    for num, label in mapping.items():
+        relabel[num] = label
+    transform = (transpose, rows, tuple(cols), tuple(relabel))
+    return apply_transform(board, transform), transform
+
+
+# Returns the states canonical_form() carries on from for a complete grid,
+# with its first two output rows placed, or None if it has too many column
+# orders to try, see MAX_TIED. Every first row relabels to 1 to size in
+# output order, whichever way its columns go, so trying every order of its
+# new numbers would tie them all. Instead its labels are fixed by position,
+# and each column order is tried against the second row alone, where the
+# label of a number is the output position of its column in the first row.
+def complete_states(grids, box_size):
+    size = box_size * box_size
+    if factorial(box_size) ** (box_size + 1) > MAX_TIED:
+        return None
+    best = None
+    tied = []
+    for transpose, grid in enumerate(grids):
+        for first in range(size):
+            first_cols = [0] * (size + 1)
+            for col, num in enumerate(grid[first]):
+                first_cols[num] = col
+            for second in next_rows((first,), box_size):
+                # The column in the first row of the number in each column of the second.
+                moves = [first_cols[num] for num in grid[second]]
+                for cols, positions in column_orders(box_size):
+                    key = tuple(positions[moves[col]] for col in cols)
+                    if best is None or key < best:
+                        best = key
+                        tied = []
+                    if key == best:
+                        tied.append((transpose, first, second, cols, positions))
+    states = []
+    for transpose, first, second, cols, positions in tied:
+        slots = tuple((cols[start] // box_size, tuple((col,) for col in cols[start:start + box_size]))
+                      for start in range(0, size, box_size))
+        mapping = {grids[transpose][first][col]: positions[col] + 1 for col in range(size)}
+        states.append((transpose, (first, second), slots, mapping))
+    return states
+
+
+# Returns every order the columns of a board can be put in by reordering
+# stacks and the columns within them, each as (cols, positions): the
+# original column at each output position, and the output position of each
+# original column.
+@lru_cache(maxsize=None)
+def column_orders(box_size):
+    orders = []
+    for stack_order in permutations(range(box_size)):
+        for col_orders in product(*(permutations(stack_cols(stack, box_size)) for stack in stack_order)):
+            cols = tuple(col for order in col_orders for col in order)
+            positions = [0] * len(cols)
+            for position, col in enumerate(cols):
+                positions[col] = position
+            orders.append((cols, tuple(positions)))
+    return orders
+
+
+# Returns the original rows that may go next in the output: any row of a
+# band not used yet when starting a band, otherwise the rows left in the
+# current band.
+def next_rows(rows, box_size):
+    if len(rows) % box_size == 0:
+        used = set(row // box_size for row in rows)
+        return [row for row in range(box_size * box_size) if row // box_size not in used]
+    band = rows[-1] // box_size
+    return [row for row in range(band * box_size, (band + 1) * box_size) if row not in rows]
+
+
+# Returns the smallest output row the original row can give with the
+# columns arranged as the slots allow, as a tuple. Numbers already
+# relabelled take their labels, new ones the labels after them in order.
+def row_key(values, slots, mapping, box_size):
+    key = []
+    label = len(mapping) + 1
+    for stack_keys in slot_keys(values, slots, mapping, box_size):
+        for part in stack_keys:
+            if part == NEW:
+                part = label
+                label += 1
+            key.append(part)
+    return tuple(key)
+
+
+# Returns the smallest order of the values in each stack of the slots, one
+# tuple per stack in output order, with NEW for numbers not relabelled yet.
+def slot_keys(values, slots, mapping, box_size):
+    keys = []
+    for stacks, groups in slots:
+        if groups is None:
+            stack_keys = [group_key(values, stack_cols(stack, box_size), mapping) for stack in stacks]
+            keys.extend(sorted(stack_keys))
+        else:
+            keys.append(tuple(part for group in groups for part in group_key(values, group, mapping)))
+    return keys
+
+
+# Returns the values of a group of columns that can't be told apart, in
+# their smallest order: empty cells first, then labels, then NEW numbers.
+def group_key(values, group, mapping):
+    return tuple(sorted(mapping.get(values[col], NEW) if values[col] else 0 for col in group))
+
+
+# Returns the columns of a stack.
+def stack_cols(stack, box_size):
+    return tuple(range(stack * box_size, (stack + 1) * box_size))
+
+
+# Yields every (slots, mapping) the columns can be left in after placing the
+# original row at its smallest, see row_key(). A slot is (stacks, None) for
+# stacks whose columns have all been empty so far, in any order, or
+# (stack, groups) for a stack in place, its columns split into groups, in
+# order, that can be told apart. Numbers new to the row that could go
+# either way in a group (or between stacks that are alike) are tried in
+# every order, since which gets the lower label shapes the rows after.
+def arrange(values, slots, mapping, box_size):
+    # Each branch is (slots so far, mapping so far).
+    branches = [((), mapping)]
+    for stacks, groups in slots:
+        if groups is not None:
+            branches = split_branches(values, branches, [(stacks, groups)])
+            continue
+        # Order the untouched stacks by their smallest keys. Alike ones that
+        # hold numbers are tried in every order, empty ones stay unordered.
+        keyed = {}
+        for stack in stacks:
+            keyed.setdefault(group_key(values, stack_cols(stack, box_size), mapping), []).append(stack)
+        orders = []
+        for key in sorted(keyed):
+            alike = keyed[key]
+            if any(key):
+                orders.append([[(stack, (stack_cols(stack, box_size),)) for stack in order]
+                               for order in permutations(alike)])
+            elif len(alike) > 1:
+                orders.append([[(tuple(alike), None)]])
+            else:
+                orders.append([[(alike[0], (stack_cols(alike[0], box_size),))]])
+        new_branches = []
+        for choice in product(*orders):
+            new_branches.extend(split_branches(values, branches, [slot for part in choice for slot in part]))
+        branches = new_branches
+    return branches
+
+
+# Returns the branches of arrange() with the new slots added to each, the
+# column groups of every stack in place split by the row's values.
+def split_branches(values, branches, new_slots):
+    for stack, groups in new_slots:
+        if groups is None:
+            branches = [(done + ((stack, None),), labels) for done, labels in branches]
+        else:
+            branches = [(done + ((stack, new_groups),), new_labels)
+                        for done, labels in branches
+                        for new_groups, new_labels in split_groups(values, groups, labels)]
+    return branches
+
+
+# Yields every (groups, mapping) a stack's column groups can be split into
+# by the row's values: the empty cells of a group stay together, labelled
+# numbers go in label order, and new numbers are tried in every order,
+# each order relabelling them as they come.
+def split_groups(values, groups, mapping):
+    parts = []
+    for group in groups:
+        empty = tuple(col for col in group if not values[col])
+        known = sorted((col for col in group if values[col] and values[col] in mapping),
+                       key=lambda col: mapping[values[col]])
+        new = [col for col in group if values[col] and values[col] not in mapping]
+        orders = [perm for perm in permutations(new)] if len(new) > 1 else [tuple(new)]
+        parts.append([((empty,) if empty else ()) + tuple((col,) for col in known)
+                      + tuple((col,) for col in order) for order in orders])
+    for choice in product(*parts):
+        labels = dict(mapping)
+        new_groups = []
+        for part in choice:
+            for group in part:
+                if len(group) == 1 and values[group[0]] and values[group[0]] not in labels:
+                    labels[values[group[0]]] = len(labels) + 1
+                new_groups.append(group)
+        yield tuple(new_groups), labels
+
+
+# Returns the columns of the slots, one tuple per stack in output order.
+def slot_columns(slots, box_size):
+    cols = []
+    for stacks, groups in slots:
+        if groups is None:
+            cols.extend(stack_cols(stack, box_size) for stack in stacks)
+        else:
+            cols.append(tuple(col for group in groups for col in group))
+    return cols
+
+
+# Returns a copy of the board with a transform from canonical_form() applied:
+# transposed if it says so, then its rows and columns picked in the given
+# orders and its numbers relabelled.
+def apply_transform(board, transform):
+    transpose, rows, cols, relabel = transform
+    if transpose:
+        board = [list(col) for col in zip(*board)]
+    return [[relabel[board[row][col]] for col in cols] for row in rows]
+
+
+# Returns a copy of a board with a transform undone, so that undoing the
+# transform that turned a puzzle into its canonical form on the canonical
+# form's solution gives the puzzle's own solution.
+def undo_transform(board, transform):
+    transpose, rows, cols, relabel = transform
+    size = len(board)
+    unlabel = [0] * (size + 1)
+    for num, label in enumerate(relabel):
+        unlabel[label] = num
+    original = [[0] * size for _ in range(size)]
+    for i, row in enumerate(rows):
+        for j, col in enumerate(cols):
+            original[row][col] = unlabel[board[i][j]]
+    if transpose:
+        original = [list(col) for col in zip(*original)]
+    return original
+
+
+# Returns a key that is the same for every equivalent copy of a puzzle, its
+# canonical form as a tuple of rows. Boards too symmetric for a canonical
+# form are keyed as they are, so only their exact copies share a key.
+def canonical_key(board):
+    return canonical_entry(tuple(map(tuple, board)))[0]
+
+
+# Returns (key, transform) for a board given as a tuple of rows, see
+# canonical_key(), with the transform None when the board is its own key.
+# Remembered, so exact repeats don't work the canonical form out again.
+@lru_cache(maxsize=CACHE_SIZE)
+def canonical_entry(board):
+    found = canonical_form(board)
+    if found is None:
+        return board, None
+    canonical, transform = found
+    return tuple(map(tuple, canonical)), transform
+
+
+# Solves the board in place like solve(), through a cache of the last
+# CACHE_SIZE puzzles solved, keyed by canonical form: a puzzle seen before,
+# or any relabelled, reordered or transposed copy of one, takes its
+# solution from the cache instead of a search. Returns whether it solved.
+def cached_solve(board):
+    key, transform = canonical_entry(tuple(map(tuple, board)))
+    solution = solve_key(key)
+    if solution is None:
+        return False
+    if transform is not None:
+        solution = undo_transform(solution, transform)
+    for row, values in enumerate(solution):
+        board[row][:] = values
+    return True
+
+
+# Counts the solutions of a puzzle like count_solutions(), through the same
+# kind of cache as cached_solve(). Equivalent copies have the same number of
+# solutions, so the count carries over as it is.
+def cached_count_solutions(board, limit=2):
+    return count_key(canonical_entry(tuple(map(tuple, board)))[0], limit)
+
+
+# Returns the solution of a board given as a tuple of rows, as a tuple of
+# rows, or None if it can't be solved.
+@lru_cache(maxsize=CACHE_SIZE)
+def solve_key(key):
+    board = [list(row) for row in key]
+    return tuple(map(tuple, board)) if solve(board) else None
+
+
+# Returns count_solutions() of a board given as a tuple of rows.
+@lru_cache(maxsize=CACHE_SIZE)
+def count_key(key, limit):
+    return count_solutions([list(row) for row in key], limit)
+
+
+# Empties the solve cache.
+def clear_cache():
+    canonical_entry.cache_clear()
+    solve_key.cache_clear()
+    count_key.cache_clear()
@@ -0,0 +1,1024 @@
+# sudoku_core.py
+
+# The sudoku engine: board model, move checking, solving and puzzle
+# generation. Pure Python, nothing in here touches pygame, so it can be
+# imported by the game, batch workers and scripts alike.
+import struct
+import time
+from functools import lru_cache
+from math import isqrt
+from random import Random, shuffle, sample
+
+from sudoku_dlx import dlx_solve, dlx_count_solutions, dlx_solutions
+
+# Constants
+ROWS = 9
+COLUMNS = 9
+EASY = 45
+MEDIUM = 35
+HARD = 25
+# Fewest starting clues a sudoku with exactly one solution can have.
+MIN_UNIQUE_CLUES = 17
+# Number of fresh boards generate_puzzle() tries before settling for the
+# one that came closest to the requested number of clues.
+GENERATE_ATTEMPTS = 10
+# Bitmask with a bit set for each of the digits 1-9.
+ALL_CANDIDATES = 0b111111111
+# Lookup tables indexed by a candidate bitmask: how many digits it holds,
+# and which digits they are in ascending order.
+CANDIDATE_COUNT = [bin(mask).count("1") for mask in range(ALL_CANDIDATES + 1)]
+CANDIDATE_DIGITS = [[num for num in range(1, 10) if mask & (1 << (num - 1))] for mask in range(ALL_CANDIDATES + 1)]
+# Board sizes that can be played and solved: 9x9, 16x16 and 25x25.
+BOARD_SIZES = [9, 16, 25]
+# How numbers are written, indexed by number. Numbers past 9 are letters.
+SYMBOLS = ".123456789ABCDEFGHIJKLMNOP"
+# The symbols as bytes, which is how a Board stores them, and the number
+# each symbol byte stands for.
+SYMBOL_CODES = SYMBOLS.encode("ascii")
+SYMBOL_VALUES = [0] * 256
+for number, code in enumerate(SYMBOL_CODES):
+    SYMBOL_VALUES[code] = number
+# Turns the other ways a puzzle line may write a cell, "0" for blank and
+# lower case letters, into the symbols a Board stores.
+LINE_SYMBOLS = bytes.maketrans(b"0" + SYMBOL_CODES[10:].lower(), b"." + SYMBOL_CODES[10:])
+
+# Game snapshots start with SNAPSHOT_MAGIC, followed by a header of board
+# size, whether the puzzle has a single solution, error count, elapsed
+# seconds and the seed the puzzle was made from (-1 if none). Then come the
+# board's and solution's cells as Board bytes, and a bitmask of which cells
+# were given at the start.
+SNAPSHOT_MAGIC = b"SDK2"
+SNAPSHOT_HEADER = struct.Struct("<4sBBIdq")
+# Search steps between looks at the clock, and at the stop flag, when
+# enumerating solutions within a time budget or until stopped.
+DEADLINE_CHECK_NODES = 1024
+# seeded_puzzle() makes each run of FAMILY_SIZE seeds a family of copies of
+# one base puzzle, that of family k generated from seed BASE_SEED + k.
+FAMILY_SIZE = 64
+BASE_SEED = 0
+# Base puzzles kept by base_puzzle(), so a batch of seeds generates each
+# family's base only once.
+BASE_CACHE_SIZE = 256
+
+# Globals
+# Name of the solving engine used by solve() and count_solutions(), or None
+# to pick one by board size, see pick_engine().
+current_engine = None
+
+
+# Board holds the numbers of a sudoku board in a bytearray of one byte per
+# cell, row by row, written the same way as a puzzle line: "." for empty
+# cells, then the SYMBOLS for 1 and up. It takes a fraction of the memory of
+# a 2-D list, copies in one go, and its puzzle line is the bytes as they
+# are. Cells are read and written as board[row, col].
+class Board:
+    __slots__ = ("size", "cells")
+
+    def __init__(self, size=ROWS, cells=None):
+        # self.size is the number of rows and columns.
+        self.size = size
+        # self.cells is the bytearray of symbols, size * size bytes long.
+        self.cells = bytearray(b"." * (size * size)) if cells is None else cells
+
+    # Returns a Board holding the numbers of a 2-D list board.
+    @classmethod
+    def from_rows(cls, rows):
+        return cls(len(rows), bytearray(SYMBOL_CODES[num] for row in rows for num in row))
+
+    # Returns a Board read from a puzzle line, written as for parse_puzzle(),
+    # or None if the line isn't a puzzle.
+    @classmethod
+    def from_line(cls, line):
+        line = line.strip()
+        size = isqrt(len(line))
+        if size * size != len(line) or size not in BOARD_SIZES or not line.isascii():
+            return None
+        cells = bytearray(line, "ascii").translate(LINE_SYMBOLS)
+        # Anything left after taking out the symbols of this size is malformed.
+        if cells.translate(None, SYMBOL_CODES[:size + 1]):
+            return None
+        return cls(size, cells)
+
+    def __getitem__(self, position):
+        row, col = position
+        return SYMBOL_VALUES[self.cells[row * self.size + col]]
+
+    def __setitem__(self, position, num):
+        row, col = position
+        self.cells[row * self.size + col] = SYMBOL_CODES[num]
+
+    def __len__(self):
+        return self.size
+
+    def __eq__(self, other):
+        return isinstance(other, Board) and self.cells == other.cells
+
+    # A Board can change, so it can't be hashed itself, use key() instead.
+    __hash__ = None
+
+    # Returns the board's puzzle line.
+    def __str__(self):
+        return self.cells.decode("ascii")
+
+    def __repr__(self):
+        return "Board(" + repr(str(self)) + ")"
+
+    # Returns the puzzle line as a memoryview of the board's own bytes, for
+    # writing out without copying. It changes along with the board.
+    def view(self):
+        return memoryview(self.cells)
+
+    # Returns the board's bytes frozen, to hash or keep in a set or dict.
+    def key(self):
+        return bytes(self.cells)
+
+    def copy(self):
+        return Board(self.size, self.cells[:])
+
+    # Makes this board a copy of another of the same size, in place.
+    def copy_from(self, other):
+        self.cells[:] = other.cells
+
+    # Returns the numbers as a 2-D list, for the solvers to work on.
+    def rows(self):
+        size = self.size
+        return [[SYMBOL_VALUES[code] for code in self.cells[row * size:(row + 1) * size]] for row in range(size)]
+
+    # Returns the number of filled cells.
+    def filled(self):
+        return len(self.cells) - self.cells.count(b".")
+
+
+# Cell class represents a single cell in the sudoku board.
+class Cell:
+    # Boards have a lot of cells, slots keep each of them small.
+    __slots__ = ("value", "temp", "row", "col", "selected", "gap")
+
+    def __init__(self, value, row, col, gap):
+        # self.value stores a correct cell answer, self.temp
+        # stores an attempted answer.
+        self.value = value
+        self.temp = 0
+        # Store row col index location of the cell
+        self.row = row
+        self.col = col
+        # A selected cell is the one outlined in red that the user clicks on.
+        self.selected = False
+        # self.gap is the length of the cell in pixels, shared with its Grid.
+        self.gap = gap
+
+    # Set the value of a cell.
+    def set(self, val):
+        self.value = val
+
+    # Set the temp value of a cell.
+    def set_temp(self, val):
+        self.temp = val
+
+
+# Grid class represents the entire sudoku board, 9x9 unless rows and cols say otherwise.
+class Grid:
+    # Class used to make the board's cells, the game swaps in one that can draw itself.
+    cell_class = Cell
+
+    def __init__(self, rows, cols, width, height, clues=EASY, puzzle=None, seed=None):
+        self.rows = rows
+        self.cols = cols
+        # self.seed is the seed the puzzle was made from by seeded_puzzle(),
+        # if it was, so the game can be made again.
+        self.seed = seed
+
+        # Use the given (board, solution) puzzle if one was generated ahead of
+        # time. Otherwise generate a random puzzle with a single solution,
+        # starting with as many clues as the desired difficulty allows.
+        if puzzle is None:
+            puzzle = generate_puzzle(clues, rows)
+        # self.board and self.solution are kept as compact Boards.
+        self.board, self.solution = (board if isinstance(board, Board) else Board.from_rows(board)
+                                     for board in puzzle)
+        # self.unique tells whether self.solution is the puzzle's only solution.
+        self.unique = generates_unique(clues, rows)
+        # self.box_size is the side of a sub-grid, 3 on a 9x9 board.
+        self.box_size = isqrt(rows)
+
+        self.width = width
+        self.height = height
+        # self.gap is the length of a cell in pixels
+        self.gap = self.width // self.rows
+        # self.cells is a 2-D array of Cell objects
+        self.cells = [[self.cell_class(self.board[i, j], i, j, self.gap) for j in range(cols)] for i in range(rows)]
+        # self.selected holds the (row, col) position of a selected cell
+        self.selected = None
+        # self.currently_filled tracks number of cells currently filled
+        self.currently_filled = self.board.filled()
+        # self.candidates holds the bitmask of numbers each cell could still
+        # take, indexed row * cols + col (0 for filled cells). It's worked
+        # out once here, then kept up to date as numbers are placed.
+        self.peers = board_units(rows)[3]
+        self.candidates = []
+        self.reset_candidates()
+        # self.givens is the board as the puzzle started, before any moves.
+        self.givens = self.board.copy()
+        # self.moves logs the (row, col, val) moves placed, in order, for
+        # undo(). self.undone holds the moves undone since, for redo().
+        self.moves = []
+        self.undone = []
+
+    # Update the board to save current cell values.
+    def update_board(self):
+        for row in range(self.rows):
+            for col in range(self.cols):
+                self.board[row, col] = self.cells[row][col].value
+
+    # Works the candidates of every cell out again from the board, for after
+    # the board was changed some other way than through place().
+    def reset_candidates(self):
+        self.candidates[:] = [0] * (self.rows * self.cols)
+        state = candidate_state(self.board.rows())
+        if state:
+            empty_cells, row_free, col_free, box_free = state
+            for row, col, box in empty_cells:
+                self.candidates[row * self.cols + col] = row_free[row] & col_free[col] & box_free[box]
+
+    # Puts a number just taken off row col back into the candidates of its
+    # peers that no other peer of theirs rules it out of, and works out the
+    # emptied cell's own candidates from its peers.
+    def restore_candidates(self, row, col, val):
+        index = row * self.cols + col
+        bit = 1 << (val - 1)
+        code = SYMBOL_CODES[val]
+        cells = self.board.cells
+        candidates = self.candidates
+        used = 0
+        for peer in self.peers[index]:
+            num = SYMBOL_VALUES[cells[peer]]
+            if num:
+                used |= 1 << (num - 1)
+            elif all(cells[other] != code for other in self.peers[peer]):
+                candidates[peer] |= bit
+        candidates[index] = ((1 << self.rows) - 1) & ~used
+
+    # Takes a number just placed at row col out of the candidates of its
+    # row, column and sub-grid.
+    def update_candidates(self, row, col, val):
+        index = row * self.cols + col
+        mask = ~(1 << (val - 1))
+        candidates = self.candidates
+        candidates[index] = 0
+        for peer in self.peers[index]:
+            candidates[peer] &= mask
+
+    # Returns a hint for the next move as (row, col, num, reason): the next
+    # cell that logic forces, worked out from the kept candidates rather than
+    # by rescanning the board. When logic can't force any cell, it gives away
+    # the solution's number for the cell with the fewest candidates instead.
+    # Returns None once the board is full.
+    def hint(self):
+        # sudoku_logic builds on this module, so it's only imported once needed.
+        from sudoku_logic import find_hint
+        found = find_hint(self.board.rows(), self.candidates)
+        if found:
+            return found
+        empty = [index for index, num in enumerate(self.board.cells) if num == ord(".")]
+        if not empty:
+            return None
+        index = min(empty, key=lambda index: self.candidates[index].bit_count())
+        row, col = divmod(index, self.cols)
+        return row, col, self.solution[row, col], "from the solution, no cell is forced by logic yet"
+
+    # Sets the selected cell's value if provided a correct answer value.
+    # A puzzle with one solution (>= 17 starting clues) has a single correct
+    # answer per cell, so the move is checked against self.solution alone.
+    # Open-ended puzzles also accept any other value that keeps the board
+    # solvable, and self.solution then follows the board to that solution.
+    def place(self, val):
+        row, col = self.selected
+        cell = self.cells[row][col]
+        # place function works only on empty cells
+        if cell.value == 0:
+            if val == self.solution[row, col] or (not self.unique and self.solvable_with(val, row, col)):
+                self.accept(row, col, val)
+                return True
+            cell.set_temp(0)
+        return False
+
+    # Tells whether place(val) would have to search for a new solution to
+    # check the move at the selected cell, which can take a while on an
+    # open-ended puzzle. The game runs that search on a worker instead, then
+    # hands the solution it found to accept().
+    def needs_search(self, val):
+        row, col = self.selected
+        return (not self.unique and self.cells[row][col].value == 0 and val != self.solution[row, col]
+                and valid(self.board.rows(), val, row, col))
+
+    # Enters val at row col as a move that has already been checked, with
+    # the new solution it leads to if that was searched for.
+    def accept(self, row, col, val, solution=None):
+        if solution is not None:
+            self.solution = solution if isinstance(solution, Board) else Board.from_rows(solution)
+        self.cells[row][col].set(val)
+        self.board[row, col] = val
+        self.update_candidates(row, col, val)
+        self.currently_filled += 1
+        self.moves.append((row, col, val))
+        self.undone.clear()
+
+    # Takes back the last move placed. Only that cell and the candidates of
+    # its peers are touched. Returns the (row, col) of the cell, or None if
+    # there are no moves to take back.
+    def undo(self):
+        if not self.moves:
+            return None
+        row, col, val = self.moves.pop()
+        self.cells[row][col].set(0)
+        self.board[row, col] = 0
+        self.restore_candidates(row, col, val)
+        self.currently_filled -= 1
+        self.undone.append((row, col, val))
+        return row, col
+
+    # Places the last move taken back by undo() again. Returns the (row, col)
+    # of the cell, or None if there is nothing to redo.
+    def redo(self):
+        if not self.undone:
+            return None
+        row, col, val = self.undone.pop()
+        self.cells[row][col].set(val)
+        self.board[row, col] = val
+        self.update_candidates(row, col, val)
+        self.currently_filled += 1
+        self.moves.append((row, col, val))
+        return row, col
+
+    # Returns the game as a compact binary snapshot, along with the given
+    # seconds played and error count. See SNAPSHOT_HEADER.
+    def to_snapshot(self, elapsed, errors):
+        givens = 0
+        for index, code in enumerate(self.givens.cells):
+            if code != SYMBOL_CODES[0]:
+                givens |= 1 << index
+        cells = self.rows * self.cols
+        seed = -1 if self.seed is None else self.seed
+        header = SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, self.rows, self.unique, errors, elapsed, seed)
+        return header + self.board.cells + self.solution.cells + givens.to_bytes((cells + 7) // 8, "little")
+
+    # Rebuilds a game from a snapshot made by to_snapshot(). Returns the
+    # (grid, elapsed, errors) it was saved with. Raises ValueError if the
+    # data isn't a snapshot.
+    @classmethod
+    def from_snapshot(cls, data, width, height):
+        if len(data) < SNAPSHOT_HEADER.size:
+            raise ValueError("not a game snapshot")
+        magic, size, unique, errors, elapsed, seed = SNAPSHOT_HEADER.unpack_from(data)
+        cells = size * size
+        start = SNAPSHOT_HEADER.size
+        if magic != SNAPSHOT_MAGIC or size not in BOARD_SIZES or len(data) != start + 2 * cells + (cells + 7) // 8:
+            raise ValueError("not a game snapshot")
+        board = Board(size, bytearray(data[start:start + cells]))
+        solution = Board(size, bytearray(data[start + cells:start + 2 * cells]))
+        givens = int.from_bytes(data[start + 2 * cells:], "little")
+        grid = cls(size, size, width, height, board.filled(), (board, solution), None if seed < 0 else seed)
+        grid.unique = bool(unique)
+        for index in range(cells):
+            if not givens >> index & 1:
+                grid.givens.cells[index] = SYMBOL_CODES[0]
+        return grid, elapsed, errors
+
+    # Checks whether placing val at row col leaves an open-ended puzzle
+    # solvable, saving the solution found if it does.
+    def solvable_with(self, val, row, col):
+        attempt = self.board.rows()
+        if not valid(attempt, val, row, col):
+            return False
+        attempt[row][col] = val
+        if solve(attempt):
+            self.solution = Board.from_rows(attempt)
+            return True
+        return False
+
+    # Sets the selected cell's temp value so that it may eventually be
+    # drawn in gray when drawing process occurs.
+    def sketch(self, val):
+        row, col = self.selected
+        self.cells[row][col].set_temp(val)
+
+    # Selects a single cell so that it may eventually be outlined in red.
+    def select(self, row, col):
+        # Reset all other cell selections.
+        for i in range(self.rows):
+            for j in range(self.cols):
+                self.cells[i][j].selected = False
+                self.cells[i][j].temp = 0
+
+        # Set chosen cell to be selected, save its row col index into self.selected
+        self.cells[row][col].selected = True
+        self.selected = (row, col)
+
+    # Sets temp value of selected cell to 0 so that
+    # it may eventually cancel an attempted choice
+    # and clear it (the gray number) from being displayed.
+    def clear(self):
+        row, col = self.selected
+        if self.cells[row][col].value == 0:
+            self.cells[row][col].set_temp(0)
+
+    # Get the board's row col index given the x and y pixel coordinates
+    # of a clicked cell.
+    def click(self, x, y):
+        # The cells cover gap * cols pixels, which can fall a little short
+        # of the width when it doesn't divide evenly.
+        if x < self.gap * self.cols and y < self.gap * self.rows:
+            # To calculate board[row][col] given x and y coordinates,
+            # row is y pixel coordinate scaled down by the gap,
+            # col is x pixel coordinate scaled down by the gap.
+            col = x // self.gap
+            row = y // self.gap
+            return row, col
+        return None
+
+    # Check if sudoku is completed by seeing if all cells are filled.
+    def is_finished(self):
+        return self.currently_filled == self.rows * self.cols
+
+
+# Checks if a move is valid
+def valid(board, num, row, col):
+    # Check row
+    for j in range(len(board[0])):
+        if board[row][j] == num and col != j:
+            return False
+    # Check column
+    for i in range(len(board)):
+        if board[i][col] == num and row != i:
+            return False
+    # Check sub-grid, 3x3 on a 9x9 board
+    box_size = isqrt(len(board))
+    sub_row = row // box_size
+    sub_col = col // box_size
+    for i in range(sub_row * box_size, sub_row * box_size + box_size):
+        for j in range(sub_col * box_size, sub_col * box_size + box_size):
+            if board[i][j] == num and (i, j) != (row, col):
+                return False
+    return True
+
+
+# Solves the board in place with the current solving engine, or the named
+# one. Setting random randomizes the order in which numbers are tried, which
+# is used to fill blank boards; passing a random.Random draws that order
+# from it, so the same seed fills the same board. Returns whether the board
+# was solved.
+def solve(board, random=False, engine=None):
+    return ENGINES[pick_engine(board, engine)][0](board, random)
+
+
+# Counts the solutions of a puzzle with the current solving engine, or the
+# named one, stopping as soon as limit of them have been found.
+# count_solutions(board, 2) == 1 tells whether a puzzle has exactly one
+# solution without enumerating the rest. The board is left as is.
+def count_solutions(board, limit=2, engine=None):
+    return ENGINES[pick_engine(board, engine)][1](board, limit)
+
+
+# Yields the solutions of a puzzle one at a time, each as a new 2-D list,
+# using the current solving engine or the named one. Solutions are found
+# lazily as they're asked for, so memory use stays the same however many
+# there are. Stops early, without an error, once max_solutions have been
+# yielded, time_budget seconds have gone by or the stop flag (anything with
+# is_set(), like a threading.Event) is set, so another thread can cancel
+# the search. The board is left as is. Returns a SolutionSearch, whose
+# cut_short tells afterwards whether it ran out of time or was stopped.
+def iter_solutions(board, max_solutions=None, time_budget=None, engine=None, stop=None):
+    if max_solutions is not None and max_solutions < 0:
+        max_solutions = 0
+    deadline = None if time_budget is None else time.monotonic() + time_budget
+    return SolutionSearch(ENGINES[pick_engine(board, engine)][2](board, deadline, stop), max_solutions)
+
+
+# The solutions iter_solutions() yields, from an engine's solutions
+# generator, up to max_solutions (None for all). Once it has run out,
+# cut_short tells whether the engine gave up at its deadline or stop flag
+# before finding them all, rather than going by the clock afterwards.
+class SolutionSearch:
+    def __init__(self, solutions, max_solutions=None):
+        self.solutions = solutions
+        self.max_solutions = max_solutions
+        self.found = 0
+        self.cut_short = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.found == self.max_solutions:
+            self.solutions.close()
+            raise StopIteration
+        try:
+            solution = next(self.solutions)
+        except StopIteration as end:
+            self.cut_short = bool(end.value)
+            raise StopIteration from None
+        self.found += 1
+        return solution
+
+
+# Returns the name of the engine to solve a board with: the named one, or
+# else the current one. With neither set, 9x9 boards get the bitmask search
+# and bigger ones Dancing Links, since the bitmask search has a long tail
+# of puzzles that take it seconds on 16x16 and 25x25 boards.
+def pick_engine(board, engine=None):
+    return engine or current_engine or ("bitmask" if len(board) == ROWS else "dlx")
+
+
+# Picks the solving engine used by solve() and count_solutions(), one of
+# ENGINES, or None to pick by board size again.
+def set_engine(name):
+    global current_engine
+    if name is not None and name not in ENGINES:
+        raise ValueError("unknown solving engine: " + str(name))
+    current_engine = name
+
+
+# Backtracking algorithm to solve sudoku puzzle. The digits still free in
+# every row, column and sub-grid are kept as bitmasks (bit num - 1 stands
+# for num) so a cell's candidates are found without rescanning the board.
+def bitmask_solve(board, random=False):
+    state = candidate_state(board)
+    if not state:
+        return False
+    empty_cells, row_free, col_free, box_free = state
+    return search(board, empty_cells, 0, row_free, col_free, box_free, random)
+
+
+# Builds the bitmasks of digits still free in every row, column and
+# sub-grid, along with the list of (row, col, box) empty cells. Works for any
+# board size. Returns None if a number is repeated among the filled cells,
+# since that can never be solved.
+def candidate_state(board):
+    size = len(board)
+    box_size = isqrt(size)
+    full = (1 << size) - 1
+    row_free = [full] * size
+    col_free = [full] * size
+    box_free = [full] * size
+    empty_cells = []
+    for row in range(size):
+        for col in range(size):
+            num = board[row][col]
+            box = (row // box_size) * box_size + col // box_size
+            if num == 0:
+                empty_cells.append((row, col, box))
+                continue
+            bit = 1 << (num - 1)
+            if not row_free[row] & col_free[col] & box_free[box] & bit:
+                return None
+            row_free[row] ^= bit
+            col_free[col] ^= bit
+            box_free[box] ^= bit
+    return empty_cells, row_free, col_free, box_free
+
+
+# Returns the units of a board of the given size, with cells numbered row by
+# row (0-80 on a 9x9 board). Each unit is the list of cells in a row, column
+# or sub-grid, and each cell's peers are the other cells that share a unit
+# with it. Returns (row units, column units, sub-grid units, peers).
+@lru_cache(maxsize=None)
+def board_units(size):
+    box_size = isqrt(size)
+    row_units = [[row * size + col for col in range(size)] for row in range(size)]
+    col_units = [[row * size + col for row in range(size)] for col in range(size)]
+    box_units = [[(box_row + i) * size + box_col + j for i in range(box_size) for j in range(box_size)]
+                 for box_row in range(0, size, box_size) for box_col in range(0, size, box_size)]
+    peers = [set() for _ in range(size * size)]
+    for unit in row_units + col_units + box_units:
+        for index in unit:
+            peers[index].update(unit)
+    peers = [sorted(cells - {index}) for index, cells in enumerate(peers)]
+    return row_units, col_units, box_units, peers
+
+
+# Recursive step of bitmask_solve(). empty_cells[:depth] have already been
+# filled in, the remaining ones are still empty.
+def search(board, empty_cells, depth, row_free, col_free, box_free, random):
+    # Puzzle is solved if there are no more empty cells.
+    if depth == len(empty_cells):
+        return True
+
+    # Branch on the most constrained empty cell.
+    best_mask = most_constrained(empty_cells, depth, row_free, col_free, box_free)
+    if best_mask == 0:
+        return False
+    row, col, box = empty_cells[depth]
+
+    # Setting random randomizes the order in which
+    # the algorithm attempts to get a correct answer
+    # for a cell. Otherwise the candidates go in increasing order.
+    candidates = mask_digits(best_mask)
+    if random:
+        candidates = candidates[:]
+        if random is True:
+            shuffle(candidates)
+        else:
+            random.shuffle(candidates)
+    for num in candidates:
+        bit = 1 << (num - 1)
+        board[row][col] = num
+        row_free[row] ^= bit
+        col_free[col] ^= bit
+        box_free[box] ^= bit
+        if search(board, empty_cells, depth + 1, row_free, col_free, box_free, random):
+            return True
+        row_free[row] |= bit
+        col_free[col] |= bit
+        box_free[box] |= bit
+    board[row][col] = 0
+    # Exhausted all possibilities for a cell, no solution possible at this recursive call.
+    return False
+
+
+# Finds the most constrained of the empty cells from depth on, the one with
+# the fewest candidates left, and swaps it into empty_cells[depth]. Returns
+# its candidate bitmask, which is 0 if the cell has none (a dead end). A
+# cell with a single candidate can't be beaten, so the scan stops early.
+def most_constrained(empty_cells, depth, row_free, col_free, box_free):
+    best = depth
+    best_mask = 0
+    best_count = len(row_free) + 1
+    for k in range(depth, len(empty_cells)):
+        row, col, box = empty_cells[k]
+        mask = row_free[row] & col_free[col] & box_free[box]
+        count = mask.bit_count()
+        if count < best_count:
+            best, best_mask, best_count = k, mask, count
+            if count <= 1:
+                break
+    empty_cells[depth], empty_cells[best] = empty_cells[best], empty_cells[depth]
+    return best_mask
+
+
+# Returns the digits held by a candidate bitmask, in ascending order.
+def mask_digits(mask):
+    if mask <= ALL_CANDIDATES:
+        return CANDIDATE_DIGITS[mask]
+    digits = []
+    while mask:
+        low_bit = mask & -mask
+        digits.append(low_bit.bit_length())
+        mask ^= low_bit
+    return digits
+
+
+# Solves the board like bitmask_solve(), but one step at a time so the search can be
+# shown as it happens. Yields (row, col, num) each time a number is placed on
+# the board, and (row, col, 0) each time one is taken back off after a dead
+# end. The board is updated before each step is yielded, and ends up solved
+# if there is a solution, or back to how it started if there isn't.
+def solve_steps(board):
+    state = candidate_state(board)
+    if not state:
+        return
+    empty_cells, row_free, col_free, box_free = state
+    # stack[depth] iterates over the candidates left to try for empty_cells[depth].
+    stack = []
+    while len(stack) < len(empty_cells):
+        depth = len(stack)
+        mask = most_constrained(empty_cells, depth, row_free, col_free, box_free)
+        stack.append(iter(mask_digits(mask)))
+
+        # Try the next candidate of the deepest cell, backing up to the
+        # previous cells when one runs out.
+        while stack:
+            row, col, box = empty_cells[len(stack) - 1]
+            num = board[row][col]
+            if num != 0:
+                bit = 1 << (num - 1)
+                board[row][col] = 0
+                row_free[row] |= bit
+                col_free[col] |= bit
+                box_free[box] |= bit
+                yield row, col, 0
+            num = next(stack[-1], 0)
+            if num != 0:
+                bit = 1 << (num - 1)
+                board[row][col] = num
+                row_free[row] ^= bit
+                col_free[col] ^= bit
+                box_free[box] ^= bit
+                yield row, col, num
+                break
+            stack.pop()
+        if not stack:
+            return
+
+
+# Counts the solutions of a puzzle with the bitmask search, stopping as soon
+# as limit of them have been found. The board is left as is.
+def bitmask_count_solutions(board, limit=2):
+    state = candidate_state(board)
+    if not state:
+        return 0
+    empty_cells, row_free, col_free, box_free = state
+    return count_search(board, empty_cells, 0, row_free, col_free, box_free, limit)
+
+
+# Recursive step of bitmask_count_solutions(), works like search() but keeps
+# going after a solution until limit solutions have been counted.
+def count_search(board, empty_cells, depth, row_free, col_free, box_free, limit):
+    if depth == len(empty_cells):
+        return 1
+
+    best_mask = most_constrained(empty_cells, depth, row_free, col_free, box_free)
+    if best_mask == 0:
+        return 0
+    row, col, box = empty_cells[depth]
+
+    found = 0
+    for num in mask_digits(best_mask):
+        bit = 1 << (num - 1)
+        board[row][col] = num
+        row_free[row] ^= bit
+        col_free[col] ^= bit
+        box_free[box] ^= bit
+        found += count_search(board, empty_cells, depth + 1, row_free, col_free, box_free, limit - found)
+        row_free[row] |= bit
+        col_free[col] |= bit
+        box_free[box] |= bit
+        if found >= limit:
+            break
+    board[row][col] = 0
+    return found
+
+
+# Yields every solution of a puzzle with the bitmask search, each as a new
+# 2-D list, until the search is done, the time.monotonic() deadline (if
+# any) passes or the stop flag (if any) is set. Works like solve_steps(),
+# keeping its own stack rather than recursing, so it can be paused between
+# solutions and never runs into Python's recursion limit. The board is left as
+# is. Returns True if it gave up at the deadline or stop flag.
+def bitmask_solutions(board, deadline=None, stop=None):
+    board = [row[:] for row in board]
+    state = candidate_state(board)
+    if not state:
+        return
+    empty_cells, row_free, col_free, box_free = state
+    # stack[depth] iterates over the candidates left to try for empty_cells[depth].
+    stack = []
+    nodes = 0
+    while True:
+        if len(stack) == len(empty_cells):
+            yield [row[:] for row in board]
+        else:
+            mask = most_constrained(empty_cells, len(stack), row_free, col_free, box_free)
+            stack.append(iter(mask_digits(mask)))
+
+        # Try the next candidate of the deepest cell, backing up to the
+        # previous cells when one runs out.
+        while stack:
+            row, col, box = empty_cells[len(stack) - 1]
+            num = board[row][col]
+            if num != 0:
+                bit = 1 << (num - 1)
+                board[row][col] = 0
+                row_free[row] |= bit
+                col_free[col] |= bit
+                box_free[box] |= bit
+            num = next(stack[-1], 0)
+            if num != 0:
+                bit = 1 << (num - 1)
+                board[row][col] = num
+                row_free[row] ^= bit
+                col_free[col] ^= bit
+                box_free[box] ^= bit
+                break
+            stack.pop()
+        if not stack:
+            return
+        # Looking at the clock is slow next to a search step, so it's only
+        # done every so often, along with the stop flag.
+        nodes += 1
+        if nodes % DEADLINE_CHECK_NODES == 0 and (deadline is not None and time.monotonic() > deadline
+                                                  or stop is not None and stop.is_set()):
+            return True
+
+
+# Solving engines that can be picked at runtime, by name. Each is a triple
+# of solve, count_solutions and solutions functions, the first two taking
+# the same arguments as those, the last a board, a time.monotonic()
+# deadline and a stop flag (either may be None), returning True if it gave
+# up at either, like bitmask_solutions().
+# "bitmask" is the backtracking search above; "dlx" is Dancing Links, whose
+# running time is more predictable on pathological and open-ended boards.
+ENGINES = {
+    "bitmask": (bitmask_solve, bitmask_count_solutions, bitmask_solutions),
+    "dlx": (dlx_solve, dlx_count_solutions, dlx_solutions),
+}
+
+
+# Generates a random puzzle of the given size with the given number of
+# starting clues, drawing from rng (a random.Random) if given, so the same
+# seed generates the same puzzle. Returns the puzzle board and its solution.
+def generate_puzzle(clues, size=ROWS, rng=None):
+    best = None
+    # Bigger boards take longer to thin out, so they get a single attempt.
+    attempts = GENERATE_ATTEMPTS if size == ROWS else 1
+    for _ in range(attempts):
+        board, solution = remove_numbers(clues, size, rng)
+        filled = sum(1 for row in board for num in row if num != 0)
+        if best is None or filled < best[0]:
+            best = (filled, board, solution)
+        if filled <= clues:
+            break
+    return best[1], best[2]
+
+
+# Tells whether generate_puzzle() guarantees that a puzzle of this size and
+# number of clues has exactly one solution.
+def generates_unique(clues, size=ROWS):
+    return size != ROWS or clues >= MIN_UNIQUE_CLUES
+
+
+# Fills a blank board with random values using backtracking, then removes
+# correct answers from it until only the given number of clues is left.
+# Clues are only removed while the puzzle keeps exactly one solution, so
+# fewer clues may remain when the board runs out of removable cells. Below
+# MIN_UNIQUE_CLUES no 9x9 puzzle can have one solution, so clues are removed
+# freely. A clue the rest of the board still forces is always removable; on
+# a 9x9 board any other clue is removed if no solution with another number
+# in its cell turns up. On bigger boards that search is too slow, so only
+# forced clues are removed. Draws
+# from rng (a random.Random) if given, otherwise from the random module.
+def remove_numbers(clues, size=ROWS, rng=None):
+    board = [[0 for _ in range(size)] for _ in range(size)]
+    # The bitmask search has a long tail filling big blank boards at random,
+    # Dancing Links fills them in predictable time. The engines fill boards
+    # differently, so a seeded fill always uses the same one.
+    if size != ROWS:
+        engine = "dlx"
+    else:
+        engine = "bitmask" if rng else None
+    solve(board, random=rng or True, engine=engine)
+    solution = [row[:] for row in board]
+    filled = size * size
+    state = candidate_state(board)
+    positions = [(row, col) for row in range(size) for col in range(size)]
+    # Each cell is visited once in a random order, sampled up front.
+    for row, col in (rng.sample if rng else sample)(positions, len(positions)):
+        if filled <= clues:
+            break
+        num = board[row][col]
+        board[row][col] = 0
+        if size == ROWS and clues < MIN_UNIQUE_CLUES:
+            removable = True
+        elif is_forced(board, row, col, num, state):
+            removable = True
+        elif size == ROWS and not has_other_solution(board, row, col, state):
+            # is_forced() left num taken, free it now the cell is empty.
+            free_number(state, row, col, num)
+            removable = True
+        else:
+            removable = False
+        if removable:
+            filled -= 1
+        else:
+            board[row][col] = num
+    return board, solution
+
+
+# Tells whether the board has a solution with something other than its old
+# number in the empty cell at row col, the one just emptied. Before that the
+# board had a single solution, and any solution with the old number there
+# is that one, so this tells whether emptying the cell let in a second
+# solution, without counting the old one over again. state is the board's
+# candidate_state() with the old number still taken, as is_forced() leaves it.
+def has_other_solution(board, row, col, state):
+    empty_cells, row_free, col_free, box_free = state
+    box_size = isqrt(len(board))
+    box = (row // box_size) * box_size + col // box_size
+    for other in mask_digits(row_free[row] & col_free[col] & box_free[box]):
+        attempt = [values[:] for values in board]
+        attempt[row][col] = other
+        if solve(attempt):
+            return True
+    return False
+
+
+# Marks num as free again in the row, column and sub-grid of row col in a
+# board's candidate_state().
+def free_number(state, row, col, num):
+    empty_cells, row_free, col_free, box_free = state
+    box_size = isqrt(len(row_free))
+    bit = 1 << (num - 1)
+    row_free[row] |= bit
+    col_free[col] |= bit
+    box_free[(row // box_size) * box_size + col // box_size] |= bit
+
+
+# Checks whether num is the only number the empty cell at row col can take
+# given the rest of the board: either it's the cell's last candidate, or no
+# other cell in one of its row, column or sub-grid can take num. Emptying a
+# cell like that can't give the puzzle another solution. state is the
+# board's candidate_state() from before the cell was emptied, and is kept up
+# to date: the cell's number is freed if it's forced, and left in otherwise.
+def is_forced(board, row, col, num, state):
+    empty_cells, row_free, col_free, box_free = state
+    size = len(board)
+    box_size = isqrt(size)
+    box = (row // box_size) * box_size + col // box_size
+    bit = 1 << (num - 1)
+    row_free[row] |= bit
+    col_free[col] |= bit
+    box_free[box] |= bit
+    if row_free[row] & col_free[col] & box_free[box] == bit:
+        return True
+
+    # Collect the other empty cells of each unit, and check whether any of them could take num.
+    box_row = (row // box_size) * box_size
+    box_col = (col // box_size) * box_size
+    units = (
+        [(row, j) for j in range(size) if j != col],
+        [(i, col) for i in range(size) if i != row],
+        [(box_row + i, box_col + j) for i in range(box_size) for j in range(box_size)
+         if (box_row + i, box_col + j) != (row, col)],
+    )
+    for unit in units:
+        for i, j in unit:
+            if board[i][j] == 0 and row_free[i] & col_free[j] & box_free[(i // box_size) * box_size + j // box_size] & bit:
+                break
+        else:
+            return True
+    row_free[row] ^= bit
+    col_free[col] ^= bit
+    box_free[box] ^= bit
+    return False
+
+
+# Returns a copy of a puzzle and its solution with their symmetry shuffled,
+# the same way for both: numbers relabelled, bands and stacks reordered, rows
+# and columns reordered within them, and the boards maybe transposed. Every
+# one of these keeps the rules, so the copy has the same number of clues
+# and solutions, and is just as hard, as the original. Draws from rng.
+def transform_puzzle(board, solution, rng):
+    size = len(board)
+    box_size = isqrt(size)
+    digits = list(range(1, size + 1))
+    rng.shuffle(digits)
+    relabel = [0] + digits
+    lines = []
+    for _ in range(2):
+        order = []
+        for band in rng.sample(range(box_size), box_size):
+            order.append([band * box_size + i for i in rng.sample(range(box_size), box_size)])
+        lines.append([line for band in order for line in band])
+    rows, cols = lines
+    transpose = rng.random() < 0.5
+    puzzle = []
+    for grid in (board, solution):
+        grid = [[relabel[grid[row][col]] for col in cols] for row in rows]
+        if transpose:
+            grid = [list(row) for row in zip(*grid)]
+        puzzle.append(grid)
+    return puzzle[0], puzzle[1]
+
+
+# Returns the puzzle the seeded puzzles of a family, size and number of
+# clues are derived from, as (board, solution) tuples of rows. It is
+# generated from BASE_SEED + family the first time it's needed, so it's the
+# same in every run.
+@lru_cache(maxsize=BASE_CACHE_SIZE)
+def base_puzzle(clues, size=ROWS, family=0):
+    board, solution = generate_puzzle(clues, size, Random(BASE_SEED + family))
+    return tuple(map(tuple, board)), tuple(map(tuple, solution))
+
+
+# Returns the (board, solution) puzzle for a seed, a shuffled copy of the
+# base puzzle of its family (seed // FAMILY_SIZE) for its size and clues.
+# Seeds in a family give different looking but equally hard puzzles in
+# microseconds instead of a search, once the base is generated, and the
+# same seed always gives the same one, so a game can be recreated from it.
+def seeded_puzzle(seed, clues, size=ROWS):
+    return transform_puzzle(*base_puzzle(clues, size, seed // FAMILY_SIZE), Random(seed))
+
+
+# Returns the row col index of an empty cell, if found.
+def find_empty_cell(board):
+    for row in range(len(board)):
+        for col in range(len(board[0])):
+            if board[row][col] == 0:
+                return row, col
+    return None
+
+
+# Reads a puzzle written as a single line, row by row: 81 characters for a
+# 9x9 board, 256 for 16x16 or 625 for 25x25. Numbers past 9 are written as
+# letters (A for 10, B for 11, ...), and "0" or "." mark empty cells.
+# Returns the board as a 2-D list, or None if the line isn't a puzzle. Use
+# Board.from_line() to keep it compact instead.
+def parse_puzzle(line):
+    board = Board.from_line(line)
+    return board.rows() if board else None
+
+
+# Writes a board, a 2-D list or a Board, as a single line, with "." for empty cells.
+def format_puzzle(board):
+    if isinstance(board, Board):
+        return str(board)
+    return "".join(SYMBOLS[num] for row in board for num in row)
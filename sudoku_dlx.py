@@ -0,0 +1,241 @@
+# sudoku_dlx.py
+
+# Dancing Links solving engine. The board is turned into an exact cover
+# problem: every cell must hold one number, and every row, column and
+# sub-grid must hold each number once, giving 4 * 81 = 324 constraints for
+# a 9x9 board. Each possible (cell, number) placement covers four of them,
+# and Knuth's Algorithm X picks placements until every constraint is
+# covered exactly once, always branching on the constraint with the fewest
+# placements left.
+import time
+from math import isqrt
+from random import shuffle
+
+# Constants
+# Search steps between looks at the clock, and at the stop flag, when
+# searching to a deadline or until stopped.
+DEADLINE_CHECK_NODES = 1024
+
+
+# DancingLinks holds the exact cover matrix of a board as a grid of nodes
+# doubly linked left/right along each placement and up/down along each
+# constraint. Node 0 is the root, nodes 1 to self.columns are the constraint
+# headers, and the rest belong to placements.
+class DancingLinks:
+    def __init__(self, board):
+        size = len(board)
+        box_size = isqrt(size)
+        cells = size * size
+        # self.placements[node] is the (row, col, num) placement a node belongs to.
+        self.placements = [None]
+        self.broken = False
+
+        # Constraints already met by the board's filled cells are left out.
+        # Constraint ids: cell, then row-number, column-number and box-number.
+        met = set()
+        for row in range(size):
+            for col in range(size):
+                num = board[row][col]
+                if num != 0:
+                    box = (row // box_size) * box_size + col // box_size
+                    ids = self.constraint_ids(size, row, col, box, num)
+                    if met.intersection(ids):
+                        self.broken = True
+                    met.update(ids)
+        header = {}
+        for constraint in range(4 * cells):
+            if constraint not in met:
+                header[constraint] = len(header) + 1
+                self.placements.append(None)
+        self.columns = len(header)
+
+        # Root and headers start out linked in a ring, each an empty column.
+        count = self.columns + 1
+        self.left = [i - 1 for i in range(count)]
+        self.left[0] = self.columns
+        self.right = [i + 1 for i in range(count)]
+        self.right[self.columns] = 0
+        self.up = list(range(count))
+        self.down = list(range(count))
+        self.column = list(range(count))
+        self.sizes = [0] * count
+
+        for row in range(size):
+            for col in range(size):
+                if board[row][col] != 0:
+                    continue
+                box = (row // box_size) * box_size + col // box_size
+                for num in range(1, size + 1):
+                    ids = self.constraint_ids(size, row, col, box, num)
+                    # A placement clashing with a filled cell is never possible.
+                    if met.intersection(ids):
+                        continue
+                    self.add_placement([header[i] for i in ids], (row, col, num))
+
+    # Returns the ids of the four constraints a placement covers.
+    @staticmethod
+    def constraint_ids(size, row, col, box, num):
+        cells = size * size
+        return (row * size + col,
+                cells + row * size + num - 1,
+                2 * cells + col * size + num - 1,
+                3 * cells + box * size + num - 1)
+
+    # Adds a placement covering the given constraint columns to the matrix.
+    def add_placement(self, columns, placement):
+        first = len(self.column)
+        for k, col in enumerate(columns):
+            node = first + k
+            self.left.append(first + (k - 1) % len(columns))
+            self.right.append(first + (k + 1) % len(columns))
+            self.up.append(self.up[col])
+            self.down.append(col)
+            self.down[self.up[col]] = node
+            self.up[col] = node
+            self.column.append(col)
+            self.placements.append(placement)
+            self.sizes[col] += 1
+
+    # Removes a column from the header ring, and every placement in it from
+    # the other columns they cover.
+    def cover(self, col):
+        left, right, up, down, column, sizes = self.left, self.right, self.up, self.down, self.column, self.sizes
+        right[left[col]] = right[col]
+        left[right[col]] = left[col]
+        i = down[col]
+        while i != col:
+            j = right[i]
+            while j != i:
+                down[up[j]] = down[j]
+                up[down[j]] = up[j]
+                sizes[column[j]] -= 1
+                j = right[j]
+            i = down[i]
+
+    # Undoes cover(), relinking in exactly the reverse order.
+    def uncover(self, col):
+        left, right, up, down, column, sizes = self.left, self.right, self.up, self.down, self.column, self.sizes
+        i = up[col]
+        while i != col:
+            j = left[i]
+            while j != i:
+                sizes[column[j]] += 1
+                down[up[j]] = j
+                up[down[j]] = j
+                j = left[j]
+            i = up[i]
+        right[left[col]] = col
+        left[right[col]] = col
+
+    # Returns the uncovered column with the fewest placements left. depth is
+    # how many placements the search has made so far, unused here but there
+    # for sudoku_stats to record, like most_constrained()'s.
+    def smallest_column(self, depth=0):
+        right, sizes = self.right, self.sizes
+        best = right[0]
+        best_size = sizes[best]
+        col = right[best]
+        while col != 0 and best_size > 1:
+            if sizes[col] < best_size:
+                best, best_size = col, sizes[col]
+            col = right[col]
+        return best
+
+    # Yields each solution as the list of (row, col, num) placements that
+    # complete the board. The search keeps an explicit stack rather than
+    # recursing, so big boards don't run into Python's recursion limit.
+    # Setting random tries the placements of a constraint in random order,
+    # drawn from it if it's a random.Random.
+    # Given a time.monotonic() deadline, the search gives up once it passes,
+    # and given a stop flag (anything with is_set(), like a threading.Event)
+    # it gives up once the flag is set. Returns True if it gave up.
+    def solutions(self, random=False, deadline=None, stop=None):
+        if self.broken:
+            return
+        # Each stack entry is [column, its placement nodes, index of the one chosen].
+        stack = []
+        steps = 0
+        while True:
+            steps += 1
+            if steps % DEADLINE_CHECK_NODES == 0 and (deadline is not None and time.monotonic() > deadline
+                                                      or stop is not None and stop.is_set()):
+                return True
+            if self.right[0] == 0:
+                yield [self.placements[entry[1][entry[2]]] for entry in stack]
+            else:
+                col = self.smallest_column(len(stack))
+                self.cover(col)
+                nodes = []
+                node = self.down[col]
+                while node != col:
+                    nodes.append(node)
+                    node = self.down[node]
+                if random is True:
+                    shuffle(nodes)
+                elif random:
+                    random.shuffle(nodes)
+                stack.append([col, nodes, -1])
+
+            # Move on to the next placement of the deepest column, backing up
+            # to the previous columns when one runs out.
+            while stack:
+                entry = stack[-1]
+                col, nodes, chosen = entry
+                if chosen >= 0:
+                    node = nodes[chosen]
+                    j = self.left[node]
+                    while j != node:
+                        self.uncover(self.column[j])
+                        j = self.left[j]
+                chosen += 1
+                if chosen < len(nodes):
+                    entry[2] = chosen
+                    node = nodes[chosen]
+                    j = self.right[node]
+                    while j != node:
+                        self.cover(self.column[j])
+                        j = self.right[j]
+                    break
+                self.uncover(col)
+                stack.pop()
+            if not stack:
+                return
+
+
+# Solves the board in place with Dancing Links. Works like solve(), including
+# trying numbers in random order when random is set. Returns whether it solved.
+def dlx_solve(board, random=False):
+    solution = next(DancingLinks(board).solutions(random), None)
+    if solution is None:
+        return False
+    for row, col, num in solution:
+        board[row][col] = num
+    return True
+
+
+# Counts the solutions of a puzzle with Dancing Links, stopping as soon as
+# limit of them have been found. The board is left as is.
+def dlx_count_solutions(board, limit=2):
+    found = 0
+    for _ in DancingLinks(board).solutions():
+        found += 1
+        if found >= limit:
+            break
+    return found
+
+
+# Yields every solution of a puzzle with Dancing Links, each as a new 2-D
+# list, until the search is done, the time.monotonic() deadline (if any)
+# passes or the stop flag (if any) is set. The board is left as is. Returns
+# True if it gave up at the deadline or stop flag.
+def dlx_solutions(board, deadline=None, stop=None):
+    solutions = DancingLinks(board).solutions(deadline=deadline, stop=stop)
+    while True:
+        try:
+            solution = next(solutions)
+        except StopIteration as end:
+            return end.value
+        solved = [row[:] for row in board]
+        for row, col, num in solution:
+            solved[row][col] = num
+        yield solved
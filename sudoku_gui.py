@@ -0,0 +1,889 @@
+# sudoku_gui.py
+
+# The pygame game: menus, settings and the game screen. Only imported when
+# the game is launched, see Sudoku.py.
+import os
+import pygame
+import random
+import threading
+import time
+
+import sudoku_core
+import sudoku_stats
+from sudoku_core import ROWS, COLUMNS, EASY, MEDIUM, HARD, BOARD_SIZES, SYMBOLS
+from sudoku_pregen import SEED_RANGE, PuzzlePool
+from sudoku_worker import PROGRESS, DONE, TIMED_OUT, FAILED, SolverJob, find_solution, new_puzzle
+
+# Constants
+SCREEN_WIDTH = 540
+SCREEN_HEIGHT = 600
+STATS_Y_COORDINATE = 560
+GRAY = (128, 128, 128)
+WHITE = (255, 255, 255)
+BLACK = (0, 0, 0)
+RED = (255, 0, 0)
+GREEN = (0, 255, 0)
+THICK = 4
+THIN = 1
+FPS = 60
+# File an unfinished game is saved to, to resume it from the main menu.
+SAVE_PATH = os.path.join(os.path.expanduser("~"), ".sudoku_save.bin")
+# Seconds between autosaves of the game in progress.
+AUTOSAVE_INTERVAL = 10
+# Solve! animation speeds, in solver steps shown per frame. None shows as
+# many steps as fit in a frame, so even a long search never stalls the window.
+SOLVE_SPEEDS = [1, 5, 25, 100, None]
+# Seconds a move on an open-ended puzzle may take to check before it's
+# given up on. The move is turned away without counting as an error then.
+CHECK_TIME_BUDGET = 5
+# Screen areas holding the game's Time and Errors stats, on either side of
+# the 100 pixel wide Solve button, so each can be redrawn on its own.
+TIME_AREA = pygame.Rect(SCREEN_WIDTH - 180, STATS_Y_COORDINATE, 180, SCREEN_HEIGHT - STATS_Y_COORDINATE)
+ERRORS_AREA = pygame.Rect(0, STATS_Y_COORDINATE, SCREEN_WIDTH // 2 - 50, SCREEN_HEIGHT - STATS_Y_COORDINATE)
+# Strip between the board and the stats where hints are shown.
+HINT_AREA = pygame.Rect(0, SCREEN_WIDTH, SCREEN_WIDTH, STATS_Y_COORDINATE - SCREEN_WIDTH)
+# Debug overlay with the search and frame counters, shown below the Time and
+# Errors stats while toggled on with F3.
+DEBUG_AREA = pygame.Rect(0, SCREEN_HEIGHT, SCREEN_WIDTH, 60)
+
+# Globals, screen, clock and puzzle_pool are set up by run() once the game is launched.
+screen = None
+clock = None
+puzzle_pool = None
+difficulty = EASY
+# Rows and columns of the board to play on, one of BOARD_SIZES.
+board_size = ROWS
+# Index into SOLVE_SPEEDS of the current Solve! animation speed.
+solve_speed = 1
+# Loaded fonts by size, and pre-rendered symbols by (size, color).
+fonts = {}
+digit_glyphs = {}
+# Thread writing the last autosave, if any.
+saver = None
+
+
+# Cell class represents a single cell in the sudoku board, drawn onto the screen.
+class Cell(sudoku_core.Cell):
+    __slots__ = ("drawn", "marks")
+
+    def __init__(self, value, row, col, gap):
+        super().__init__(value, row, col, gap)
+        # self.drawn holds the (value, temp, selected, marks) state last drawn
+        # on the screen, so an unchanged cell isn't drawn again.
+        self.drawn = None
+        # self.marks is the bitmask of candidates shown as pencil marks, 0 for none.
+        self.marks = 0
+
+    # Tells whether the cell looks different from when it was last drawn.
+    def is_dirty(self):
+        return self.drawn != (self.value, self.temp, self.selected, self.marks)
+
+    # Returns the screen area covered by the cell.
+    def get_rect(self):
+        return pygame.Rect(self.col * self.gap, self.row * self.gap, self.gap, self.gap)
+
+    # Draw a single cell. box_size is the side of the board's sub-grids,
+    # which pencil marks are laid out like.
+    def draw(self, box_size=3):
+        # Obtain x and y pixel coordinates from the cell's row col index.
+        x = self.col * self.gap
+        y = self.row * self.gap
+
+        # Draw the cell value in black if self.value != 0,
+        # meaning the cell has its correct answer.
+        if self.value != 0:
+            text = get_glyphs(self.gap * 2 // 3, BLACK)[self.value]
+            screen.blit(text, (x + get_center(self.gap, text.get_width()), y + get_center(self.gap, text.get_height())))
+
+        # Outline cell in red if selected.
+        if self.selected:
+            pygame.draw.rect(screen, RED, (x, y, self.gap, self.gap), 3)
+            # Draw cell value in gray if self.value == 0,
+            # meaning a correct answer isn't concluded with this cell yet.
+            if self.temp != 0 and self.value == 0:
+                text = get_glyphs(self.gap * 2 // 3, GRAY)[self.temp]
+                screen.blit(text, (x + get_center(self.gap, text.get_width()), y + get_center(self.gap, text.get_height())))
+
+        # Draw the pencil marks small, each number in its own spot of a
+        # sub-grid sized layout, unless a number is being tried in the cell.
+        if self.marks and self.value == 0 and not (self.selected and self.temp):
+            spot = self.gap // box_size
+            glyphs = get_glyphs(spot * 3 // 4, GRAY)
+            mask = self.marks
+            while mask:
+                low_bit = mask & -mask
+                num = low_bit.bit_length()
+                mask ^= low_bit
+                text = glyphs[num]
+                spot_x = x + (num - 1) % box_size * spot
+                spot_y = y + (num - 1) // box_size * spot
+                screen.blit(text, (spot_x + get_center(spot, text.get_width()), spot_y + get_center(spot, text.get_height())))
+        self.drawn = (self.value, self.temp, self.selected, self.marks)
+
+
+# Grid class represents the entire sudoku board, drawn onto the screen.
+class Grid(sudoku_core.Grid):
+    cell_class = Cell
+    # Whether the candidates of the empty cells are shown as pencil marks.
+    pencil_marks = False
+
+    # Draws Grid Lines, and numbers for individual cells. Unless full is set,
+    # only the cells that changed since they were last drawn are drawn again.
+    # Returns the list of screen areas that were drawn on.
+    def draw(self, full=False):
+        if full:
+            self.draw_lines()
+
+        dirty_rects = []
+        for i in range(self.rows):
+            for j in range(self.cols):
+                cell = self.cells[i][j]
+                cell.marks = self.candidates[i * self.cols + j] if self.pencil_marks else 0
+                if full:
+                    cell.draw(self.box_size)
+                elif cell.is_dirty():
+                    # Wipe just this cell, clipping so that redrawing the
+                    # lines over it doesn't touch its neighbors.
+                    rect = cell.get_rect()
+                    screen.set_clip(rect)
+                    screen.fill(WHITE)
+                    self.draw_lines()
+                    cell.draw(self.box_size)
+                    screen.set_clip(None)
+                    dirty_rects.append(rect)
+        if full:
+            dirty_rects.append(pygame.Rect(0, 0, self.cols * self.gap, self.rows * self.gap))
+        return dirty_rects
+
+    # Draws the Grid Lines.
+    def draw_lines(self):
+        for i in range(self.rows+1):
+            # Thick lines to divide the sub-grids,
+            # regular thin lines to divide each cell
+            if i % self.box_size == 0 and i != 0:
+                thickness = THICK
+            else:
+                thickness = THIN
+            # Horizontal
+            pygame.draw.line(screen, BLACK, (0, i * self.gap), (self.cols * self.gap, i * self.gap), thickness)
+            # Vertical
+            pygame.draw.line(screen, BLACK, (i * self.gap, 0), (i * self.gap, self.rows * self.gap), thickness)
+
+
+# Returns the font of the given size, loading it the first time it's used.
+def get_font(size):
+    font = fonts.get(size)
+    if font is None:
+        font = pygame.font.SysFont("comicsans", size)
+        fonts[size] = font
+    return font
+
+
+# Returns the symbols for numbers 1-25 pre-rendered in the given font size
+# and color, indexed by number. They are rendered the first time they're used.
+def get_glyphs(size, color):
+    glyphs = digit_glyphs.get((size, color))
+    if glyphs is None:
+        font = get_font(size)
+        glyphs = [None] + [font.render(symbol, True, color) for symbol in SYMBOLS[1:]]
+        digit_glyphs[(size, color)] = glyphs
+    return glyphs
+
+
+# Draws the debug overlay with the search counters and the timings of the
+# last frame. Returns the screen area drawn on.
+def draw_debug():
+    screen.fill(WHITE, DEBUG_AREA)
+    pygame.draw.line(screen, GRAY, DEBUG_AREA.topleft, DEBUG_AREA.topright)
+    font = get_font(18)
+    search = sudoku_stats.totals
+    frames = sudoku_stats.frames
+    y = DEBUG_AREA.top + 5
+    draw_text("nodes " + str(search["nodes"]) + "   dead ends " + str(search["dead_ends"]) + "   valid() "
+              + str(search["valid_calls"]) + "   max depth " + str(search["max_depth"]), font, BLACK, 10, y)
+    draw_text("redraw " + format(frames["last_redraw_ms"], ".2f") + " ms (max " + format(frames["max_redraw_ms"], ".2f")
+              + ")   display update " + format(frames["last_update_ms"], ".2f") + " ms (max "
+              + format(frames["max_update_ms"], ".2f") + ")", font, BLACK, 10, y + 18)
+    if sudoku_stats.calls:
+        call = sudoku_stats.calls[-1]
+        draw_text("last " + call["function"] + "(): " + format(call["ms"], ".1f") + " ms, " + str(call["nodes"]) + " nodes, "
+                  + str(call["dead_ends"]) + " dead ends", font, BLACK, 10, y + 36)
+    return DEBUG_AREA
+
+
+# Opens the window, tall enough for the debug overlay if it's shown.
+def set_screen():
+    global screen
+    height = DEBUG_AREA.bottom if sudoku_stats.enabled else SCREEN_HEIGHT
+    screen = pygame.display.set_mode((SCREEN_WIDTH, height))
+
+
+# Draws the parts of the game screen that changed since the last call and
+# returns the screen areas to update. drawn remembers what is currently on
+# the screen, pass an empty dict to draw the whole screen.
+def redraw_window(grid_obj, curr_time, errors, solve_button, drawn, hint=""):
+    if not drawn:
+        screen.fill(WHITE)
+        # Draw Solve Button
+        pygame.draw.rect(screen, BLACK, solve_button)
+        draw_text("Solve!", get_font(25), RED, SCREEN_WIDTH, STATS_Y_COORDINATE + 5, True)
+        # Draw grid and board
+        grid_obj.draw(full=True)
+        dirty_rects = [screen.get_rect()]
+    else:
+        dirty_rects = grid_obj.draw()
+
+    font = get_font(40)
+    # Draw time, once per second
+    if drawn.get("time") != curr_time:
+        screen.fill(WHITE, TIME_AREA)
+        draw_text("Time: " + format_time(curr_time), font, BLACK, SCREEN_WIDTH - 180, STATS_Y_COORDINATE)
+        dirty_rects.append(TIME_AREA)
+        drawn["time"] = curr_time
+    # Draw the last hint
+    if drawn.get("hint", "") != hint:
+        screen.fill(WHITE, HINT_AREA)
+        draw_text(hint, get_font(16), BLACK, SCREEN_WIDTH, HINT_AREA.top, True)
+        dirty_rects.append(HINT_AREA)
+        drawn["hint"] = hint
+    # Draw Errors
+    if drawn.get("errors") != errors:
+        screen.fill(WHITE, ERRORS_AREA)
+        draw_text("Errors: " + str(errors), font, RED, 20, STATS_Y_COORDINATE)
+        dirty_rects.append(ERRORS_AREA)
+        drawn["errors"] = errors
+    return dirty_rects
+
+
+# Draws text onto the screen. Optional parameters choose to center the text
+# onto the middle of a given x and/or y pixel axis.
+def draw_text(text, font, color, x, y, centerx = False, centery = False):
+    text_obj = font.render(text, True, color)
+    text_rect = text_obj.get_rect()
+    if centerx and centery:
+        text_rect.topleft = (get_center(x, text_obj.get_width()), get_center(y, text_obj.get_height()))
+    elif centerx:
+        text_rect.topleft = (get_center(x, text_obj.get_width()), y)
+    elif centery:
+        text_rect.topleft = (x, get_center(y, text_obj.get_height()))
+    else:
+        text_rect.topleft = (x, y)
+    screen.blit(text_obj, text_rect)
+
+
+# Obtains pixel value to place an object at the center of a given perimeter.
+def get_center(boundary_distance, obj_distance):
+    return boundary_distance / 2 - obj_distance / 2
+
+
+# Returns the formatted string to display the game time.
+def format_time(secs):
+    sec = secs % 60
+    minute = secs // 60
+    hour = minute // 60
+    curr_time = " " + str(hour) + ":" + str(minute) + ":" + str(sec)
+    return curr_time
+
+
+# Returns the next events to handle. While animating, events are polled at
+# FPS frames per second. Otherwise this blocks until an event arrives, or
+# until timeout milliseconds pass, so idle screens use no CPU.
+def wait_for_events(animating=False, timeout=None):
+    if animating:
+        clock.tick(FPS)
+        return pygame.event.get()
+    if timeout is None:
+        event = pygame.event.wait()
+    else:
+        event = pygame.event.wait(timeout)
+    events = pygame.event.get()
+    if event.type != pygame.NOEVENT:
+        events.insert(0, event)
+    # Keep the clock in step so an animation starting next frame isn't rushed.
+    clock.tick()
+    return events
+
+
+# Returns the number of milliseconds until the game timer started at start
+# reaches its next whole second.
+def ms_until_next_second(start):
+    return 1000 - int((time.time() - start) * 1000) % 1000
+
+
+# Display the main menu.
+def main_menu():
+    pygame.display.set_caption("Sudoku")
+    game_button = pygame.Rect(get_center(SCREEN_WIDTH, 250), 120, 250, 60)
+    instructions_button = pygame.Rect(get_center(SCREEN_WIDTH, 250), 220, 250, 60)
+    settings_button = pygame.Rect(get_center(SCREEN_WIDTH, 250), 320, 250, 60)
+    resume_button = pygame.Rect(get_center(SCREEN_WIDTH, 250), 420, 250, 60)
+    running = True
+    # The main menu is static, so it's only drawn when first shown and when
+    # coming back to it from a game, instructions, or settings screen.
+    redraw = True
+    while running:
+        if redraw:
+            screen.fill(WHITE)
+            font = get_font(50)
+            draw_text("SUDOKU", font, BLACK, SCREEN_WIDTH, 40, True)
+            pygame.draw.rect(screen, BLACK, game_button)
+            draw_text("Play", font, WHITE, SCREEN_WIDTH, 120 + 15, True)
+            pygame.draw.rect(screen, BLACK, instructions_button)
+            draw_text("Instructions", font, WHITE, SCREEN_WIDTH, 220 + 15, True)
+            pygame.draw.rect(screen, BLACK, settings_button)
+            draw_text("Settings", font, WHITE, SCREEN_WIDTH, 320 + 15, True)
+            # An unfinished game can be picked back up where it was left.
+            saved = read_save()
+            if saved:
+                pygame.draw.rect(screen, BLACK, resume_button)
+                draw_text("Resume", font, WHITE, SCREEN_WIDTH, 420 + 15, True)
+            pygame.display.update()
+            redraw = False
+
+        click = False
+        for event in wait_for_events():
+            if event.type == pygame.QUIT:
+                running = False
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_ESCAPE:
+                    running = False
+            if event.type == pygame.MOUSEBUTTONDOWN:
+                if event.button:
+                    click = True
+
+        mx, my = pygame.mouse.get_pos()
+        # Enter game screen, instructions screen, or settings
+        # screen if their buttons are clicked.
+        if game_button.collidepoint(mx, my) and click:
+            game()
+            redraw = True
+        if instructions_button.collidepoint(mx, my) and click:
+            instructions()
+            redraw = True
+        if settings_button.collidepoint(mx, my) and click:
+            settings()
+            redraw = True
+        if saved and resume_button.collidepoint(mx, my) and click:
+            game(saved)
+            redraw = True
+
+    # Program is to be ended, quit pygame.
+    pygame.quit()
+
+
+# Display instructions screen.
+def instructions():
+    screen.fill(WHITE)
+    header_font = get_font(40)
+    text_font = get_font(25)
+    draw_text("Rules:", header_font, BLACK, 10, 15)
+    draw_text("A Sudoku game is number-placement puzzle. The objective is", text_font, BLACK, 10, 50)
+    draw_text("to fill a grid with digits so that each column, each row, and", text_font, BLACK, 10, 70)
+    draw_text("each of the subgrids that compose the grid (also called “boxes”,", text_font, BLACK, 10, 90)
+    draw_text("“blocks”, or “regions”) contain every number once: 1-9 on a", text_font, BLACK, 10, 110)
+    draw_text("9×9 grid with 3×3 boxes, 1-P on a 16×16 or 25×25 grid with", text_font, BLACK, 10, 130)
+    draw_text("4×4 or 5×5 boxes (A-P stand for 10-25).", text_font, BLACK, 10, 150)
+
+    draw_text("Instructions:", header_font, BLACK, 10, 185)
+    draw_text("From the main menu, click play to start a new game. Game", text_font, BLACK, 10, 220)
+    draw_text("difficulty can be adjusted by going to Settings from the main", text_font, BLACK, 10, 240)
+    draw_text("menu and selecting from various the various difficulty levels.", text_font, BLACK, 10, 260)
+
+    draw_text("To play the game, simply click on a cell of the grid, input a", text_font, BLACK, 10, 295)
+    draw_text("number from 1-9 (or A-P on bigger boards), and press", text_font, BLACK, 10, 315)
+    draw_text("enter/return to attempt to enter your answer. Correct answers", text_font, BLACK, 10, 335)
+    draw_text("will be saved onto the grid, wrong answers will not be saved and", text_font, BLACK, 10, 355)
+    draw_text("will increase the error count on the bottom left corner. To solve ", text_font, BLACK, 10, 375)
+    draw_text("the puzzle automatically, press the solve button at the bottom.", text_font, BLACK, 10, 395)
+
+    draw_text("To exit the current screen and enter the previous, click the exit", text_font, BLACK, 10, 430)
+    draw_text("button at the top of the window or press the escape key. To exit", text_font, BLACK, 10, 450)
+    draw_text("the program, click the exit button or escape key while in the", text_font, BLACK, 10, 470)
+    draw_text("main menu.", text_font, BLACK, 10, 490)
+
+    draw_text("While the puzzle is being solved, the up and down arrow keys", text_font, BLACK, 10, 525)
+    draw_text("speed up or slow down the solver.", text_font, BLACK, 10, 545)
+    draw_text("Tab shows pencil marks, and space gives a hint.", text_font, BLACK, 10, 570)
+
+    pygame.display.update()
+    running = True
+    while running:
+        for event in wait_for_events():
+            if event.type == pygame.QUIT:
+                running = False
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_ESCAPE:
+                    running = False
+
+
+# Used when clicking settings button from main menu.
+# Used to print the difficulty buttons on the settings screen.
+def print_difficulties(easy_button=None, medium_button=None, hard_button=None, custom_button=None,
+                       box_color=BLACK, clear=False):
+    if clear:
+        screen.fill(WHITE)
+        update_board_size()
+    font = get_font(50)
+    if easy_button:
+        pygame.draw.rect(screen, box_color, easy_button)
+        draw_text("Easy", font, WHITE, SCREEN_WIDTH, 120 + 15, True)
+    if medium_button:
+        pygame.draw.rect(screen, box_color, medium_button)
+        draw_text("Medium", font, WHITE, SCREEN_WIDTH, 220 + 15, True)
+    if hard_button:
+        pygame.draw.rect(screen, box_color, hard_button)
+        draw_text("Hard", font, WHITE, SCREEN_WIDTH, 320 + 15, True)
+    if custom_button:
+        pygame.draw.rect(screen, box_color, custom_button)
+        draw_text("Custom", font, WHITE, SCREEN_WIDTH, 420 + 15, True)
+
+
+# Used when custom button is clicked. Updates text below the button
+# and displays the number of starting clues selected.
+def update_custom_clues(custom_count):
+    white_box = pygame.Rect(get_center(SCREEN_WIDTH, SCREEN_WIDTH), 500, SCREEN_WIDTH, SCREEN_HEIGHT - 500)
+    pygame.draw.rect(screen, WHITE, white_box)
+    font = get_font(20)
+    draw_text("Use left and right arrow keys to adjust the number of starting clues.", font, BLACK,
+              SCREEN_WIDTH, 500, True)
+    draw_text("Starting clues = " + str(custom_count), font, BLACK, SCREEN_WIDTH, 520, True)
+
+
+# Updates the text at the top of the settings screen showing the board size.
+def update_board_size():
+    white_box = pygame.Rect(0, 30, SCREEN_WIDTH, 60)
+    pygame.draw.rect(screen, WHITE, white_box)
+    draw_text("Board size = " + str(board_size) + "x" + str(board_size), get_font(30), BLACK, SCREEN_WIDTH, 30, True)
+    draw_text("Use up and down arrow keys to change the board size.", get_font(20), BLACK, SCREEN_WIDTH, 65, True)
+
+
+# Returns the starting clues for a difficulty on a board of the given size.
+# Difficulties are set as clues on a 9x9 board, bigger boards keep the same
+# share of their cells filled in.
+def board_clues(clues, size):
+    return round(clues * size * size / (ROWS * COLUMNS))
+
+
+# Displays the settings screen. Used to set the difficulty and board size of the game.
+def settings():
+    global difficulty, board_size
+
+    easy_button = pygame.Rect(get_center(SCREEN_WIDTH, 250), 120, 250, 60)
+    medium_button = pygame.Rect(get_center(SCREEN_WIDTH, 250), 220, 250, 60)
+    hard_button = pygame.Rect(get_center(SCREEN_WIDTH, 250), 320, 250, 60)
+    custom_button = pygame.Rect(get_center(SCREEN_WIDTH, 250), 420, 250, 60)
+
+    print_difficulties(easy_button, medium_button, hard_button, custom_button, BLACK, True)
+    pygame.display.update()
+
+    # Variables for custom kept out of loop so that their values may be updated.
+    custom = False
+    custom_count = 41
+    running = True
+    while running:
+        click = False
+        for event in wait_for_events():
+            if event.type == pygame.QUIT:
+                running = False
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_ESCAPE:
+                    running = False
+                # Up and Down arrow keys step through the board sizes.
+                if event.key in (pygame.K_UP, pygame.K_DOWN):
+                    step = 1 if event.key == pygame.K_UP else -1
+                    index = BOARD_SIZES.index(board_size) + step
+                    if 0 <= index < len(BOARD_SIZES):
+                        board_size = BOARD_SIZES[index]
+                        update_board_size()
+                        pygame.display.update()
+                # Left and Right arrow keys controls the adjustment
+                # of the starting clues. Works when custom difficulty selected.
+                # Minimum number of clues is 0, Maximum is 81, scaled up
+                # to the board size when the game starts.
+                if event.key == pygame.K_LEFT:
+                    if custom:
+                        if custom_count > 0:
+                            custom_count -= 1
+                            difficulty = custom_count
+                            update_custom_clues(custom_count)
+                            pygame.display.update()
+                if event.key == pygame.K_RIGHT:
+                    if custom:
+                        if custom_count < 81:
+                            custom_count += 1
+                            difficulty = custom_count
+                            update_custom_clues(custom_count)
+                            pygame.display.update()
+            if event.type == pygame.MOUSEBUTTONDOWN:
+                if event.button:
+                    click = True
+
+        mx, my = pygame.mouse.get_pos()
+        # Color the selected difficulty box green to indicate choice.
+        if easy_button.collidepoint(mx, my) and click:
+            custom = False
+            print_difficulties(easy_button, medium_button, hard_button, custom_button, BLACK, True)
+            print_difficulties(easy_button=easy_button, box_color=GREEN)
+            difficulty = EASY
+            pygame.display.update()
+        if medium_button.collidepoint(mx, my) and click:
+            custom = False
+            print_difficulties(easy_button, medium_button, hard_button, custom_button, BLACK, True)
+            print_difficulties(medium_button=medium_button, box_color=GREEN)
+            difficulty = MEDIUM
+            pygame.display.update()
+        if hard_button.collidepoint(mx, my) and click:
+            custom = False
+            print_difficulties(easy_button, medium_button, hard_button, custom_button, BLACK, True)
+            print_difficulties(hard_button=hard_button, box_color=GREEN)
+            difficulty = HARD
+            pygame.display.update()
+        if custom_button.collidepoint(mx, my) and click:
+            custom = True
+            print_difficulties(easy_button, medium_button, hard_button, custom_button, BLACK, True)
+            print_difficulties(custom_button=custom_button, box_color=GREEN)
+            difficulty = custom_count
+            update_custom_clues(custom_count)
+            pygame.display.update()
+
+    # Start getting puzzles ready for the chosen difficulty while back at the menu.
+    puzzle_pool.want(board_clues(difficulty, board_size), board_size)
+
+
+# Returns the saved game snapshot, or None if there isn't one.
+def read_save():
+    try:
+        with open(SAVE_PATH, "rb") as file:
+            return file.read()
+    except OSError:
+        return None
+
+
+# Writes a game snapshot to the save file. It's written next to the old one
+# and swapped in, so an interrupted save can't damage it.
+def write_save(snapshot):
+    temp_path = SAVE_PATH + ".tmp"
+    try:
+        with open(temp_path, "wb") as file:
+            file.write(snapshot)
+        os.replace(temp_path, SAVE_PATH)
+    except OSError:
+        pass
+
+
+# Saves a game snapshot on a thread of its own, so the frame loop never
+# waits on the disk. Skipped if the last autosave is still being written.
+def autosave(snapshot):
+    global saver
+    if saver and saver.is_alive():
+        return
+    saver = threading.Thread(target=write_save, args=(snapshot,))
+    saver.start()
+
+
+# Waits for an autosave still being written, so it can't land after the
+# save file is replaced or removed.
+def finish_saving():
+    if saver:
+        saver.join()
+
+
+# Removes the save file, once its game is over.
+def delete_save():
+    finish_saving()
+    try:
+        os.remove(SAVE_PATH)
+    except OSError:
+        pass
+
+
+# Shows text on a blank screen while a job runs, along with how long it
+# has been running, until it's done. Escape or closing the window cancels
+# it. Returns the job's result, or None if it was cancelled or failed.
+def wait_for_job(job, text):
+    font = get_font(30)
+    shown = None
+    while True:
+        for event in wait_for_events(animating=True):
+            if event.type == pygame.QUIT or event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
+                job.cancel()
+                return None
+        for kind, value in job.poll():
+            if kind != PROGRESS:
+                return value if kind == DONE else None
+        seconds = int(job.elapsed())
+        if seconds != shown:
+            screen.fill(WHITE)
+            draw_text(text + "\u2026 " + str(seconds) + " s", font, BLACK, SCREEN_WIDTH, SCREEN_HEIGHT, True, True)
+            pygame.display.update()
+            shown = seconds
+
+
+# Display the game screen. Picks up a saved game if given its snapshot.
+def game(snapshot=None):
+    global solve_speed
+    grid_obj = None
+    errors = 0
+    elapsed = 0
+    if snapshot:
+        try:
+            grid_obj, elapsed, errors = Grid.from_snapshot(snapshot, SCREEN_WIDTH, SCREEN_WIDTH)
+        except ValueError:
+            delete_save()
+    if grid_obj is None:
+        # Initialize Grid settings. Board will be a square
+        # with sides equal to the screen's width in pixels.
+        # Every game is the seeded puzzle of a random seed. Start from one
+        # made ahead of time when there's one ready, otherwise make one on a
+        # worker that can be cancelled, since it usually generates the base
+        # puzzle of its seed's family.
+        clues = board_clues(difficulty, board_size)
+        ready = puzzle_pool.take(clues, board_size)
+        if ready is not None:
+            seed, puzzle = ready
+        else:
+            seed = random.randrange(SEED_RANGE)
+            puzzle = wait_for_job(SolverJob(new_puzzle, clues, board_size, seed).start(), "Generating puzzle")
+            if puzzle is None:
+                return
+        grid_obj = Grid(board_size, board_size, SCREEN_WIDTH, SCREEN_WIDTH, clues, puzzle, seed)
+    # Show the seed in the title, so the game can be made again from it.
+    if grid_obj.seed is not None:
+        pygame.display.set_caption("Sudoku - seed " + str(grid_obj.seed))
+    # key saves the user's input value
+    key = None
+    running = True
+    start = time.time() - elapsed
+    last_save = time.time()
+    # Set once Solve! is used, the game is over then and no longer saved.
+    given_up = False
+    solve_mode = False
+    # solver streams the Solve! search steps while in solve mode.
+    solver = None
+    # check is the worker job checking a move on an open-ended puzzle, and
+    # checking the (row, col, val) move it's checking. The board can't be
+    # changed until it's done.
+    check = None
+    checking = None
+    solve_button = pygame.Rect(get_center(SCREEN_WIDTH, 100), STATS_Y_COORDINATE, 100, 28)
+    # What redraw_window() last put on the screen, empty so the first frame is drawn in full.
+    drawn = {}
+    # Events to handle this frame, none before the first frame is drawn.
+    events = []
+    # Text of the last hint given, shown until the next move is placed.
+    hint = ""
+    while running:
+        play_time = int(time.time() - start)
+        # The board belongs to the solver while in solve mode, and stays as
+        # it is while a move is being checked.
+        busy = solve_mode or check is not None
+
+        for event in events:
+            if event.type == pygame.QUIT:
+                running = False
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_ESCAPE:
+                    running = False
+                # Numbers past 9 are typed as letters, A for 10 and so on.
+                num = SYMBOLS.find(event.unicode.upper()) if event.unicode else -1
+                if 0 < num <= grid_obj.rows:
+                    key = num
+                # F3 shows or hides the debug overlay, counting only while shown.
+                if event.key == pygame.K_F3:
+                    if sudoku_stats.enabled:
+                        sudoku_stats.disable()
+                    else:
+                        sudoku_stats.reset()
+                        sudoku_stats.enable()
+                    set_screen()
+                    drawn.clear()
+                if event.key == pygame.K_BACKSPACE or event.key == pygame.K_DELETE:
+                    grid_obj.clear()
+                    key = None
+                # Up and Down arrow keys speed up and slow down the Solve! animation.
+                if event.key == pygame.K_UP:
+                    solve_speed = min(solve_speed + 1, len(SOLVE_SPEEDS) - 1)
+                if event.key == pygame.K_DOWN:
+                    solve_speed = max(solve_speed - 1, 0)
+                # Ctrl+Z takes back the last move, Ctrl+Y (or Ctrl+Shift+Z) puts it back.
+                if event.key in (pygame.K_z, pygame.K_y) and event.mod & pygame.KMOD_CTRL and not busy:
+                    if event.key == pygame.K_y or event.mod & pygame.KMOD_SHIFT:
+                        moved = grid_obj.redo()
+                    else:
+                        moved = grid_obj.undo()
+                    if moved:
+                        grid_obj.select(*moved)
+                        key = None
+                        hint = ""
+                # Tab shows or hides pencil marks of every empty cell's candidates.
+                if event.key == pygame.K_TAB and not solve_mode:
+                    grid_obj.pencil_marks = not grid_obj.pencil_marks
+                # Space selects the next cell that logic forces and tries its
+                # number there, with the reason shown below the board.
+                if event.key == pygame.K_SPACE and not busy:
+                    found = grid_obj.hint()
+                    if found:
+                        i, j, num, reason = found
+                        grid_obj.select(i, j)
+                        grid_obj.sketch(num)
+                        hint = ("Hint: " + SYMBOLS[num] + " at row " + str(i + 1) + ", column " + str(j + 1)
+                                + ": " + reason)
+                        key = None
+                if event.key == pygame.K_RETURN and grid_obj.selected and not busy:
+                    i, j = grid_obj.selected
+                    val = grid_obj.cells[i][j].temp
+                    # A move that needs a search for a new solution is
+                    # checked on a worker, see below.
+                    if val != 0 and grid_obj.needs_search(val):
+                        attempt = grid_obj.board.rows()
+                        attempt[i][j] = val
+                        check = SolverJob(find_solution, attempt, time_budget=CHECK_TIME_BUDGET).start()
+                        checking = (i, j, val)
+                        busy = True
+                        key = None
+                    elif val != 0:
+                        if grid_obj.place(val):
+                            hint = ""
+                        else:
+                            errors += 1
+                        key = None
+
+            if event.type == pygame.MOUSEBUTTONDOWN:
+                mx, my = pygame.mouse.get_pos()
+                if solve_button.collidepoint(mx, my) and not busy:
+                    solve_mode = True
+                    given_up = True
+                    delete_save()
+                    # Looked up on sudoku_core each time, so the debug overlay can count it.
+                    solver = sudoku_core.solve_steps(grid_obj.board.rows())
+                    # The solver's steps don't keep the candidates up to
+                    # date, so pencil marks are put away until it's done.
+                    grid_obj.pencil_marks = False
+                    hint = ""
+
+                clicked = grid_obj.click(mx, my)
+                if clicked:
+                    # Set the clicked cell to be selected.
+                    grid_obj.select(clicked[0], clicked[1])
+                    key = None
+
+        # Update selected cell's temp value to be user inputted key.
+        if grid_obj.selected and key:
+            grid_obj.sketch(key)
+
+        # Pick up how the move being checked is getting on, showing the
+        # search's progress until it's done.
+        if check is not None:
+            for kind, value in check.poll():
+                i, j, val = checking
+                if kind == PROGRESS:
+                    hint = "Checking " + SYMBOLS[val] + "\u2026 " + str(value) + " positions tried"
+                    continue
+                if kind == DONE and value is not None:
+                    grid_obj.accept(i, j, val, value)
+                    hint = ""
+                elif kind == TIMED_OUT:
+                    grid_obj.cells[i][j].set_temp(0)
+                    hint = "Couldn't check " + SYMBOLS[val] + " in time, try another number"
+                elif kind == FAILED:
+                    grid_obj.cells[i][j].set_temp(0)
+                    hint = "Couldn't check " + SYMBOLS[val] + ": " + str(value)
+                else:
+                    grid_obj.cells[i][j].set_temp(0)
+                    errors += 1
+                    hint = ""
+                check = None
+
+        if solve_mode:
+            # Show the next steps of the solver's search. Each step places a
+            # number on, or takes one back off, the board it's solving.
+            steps = SOLVE_SPEEDS[solve_speed]
+            frame_end = time.perf_counter() + 1 / FPS
+            shown = 0
+            # The search is over once it runs out of steps.
+            finished = True
+            for i, j, num in solver:
+                grid_obj.cells[i][j].set(num)
+                grid_obj.board[i, j] = num
+                grid_obj.currently_filled += 1 if num else -1
+                shown += 1
+                if shown == steps or steps is None and time.perf_counter() > frame_end:
+                    finished = False
+                    break
+            if shown:
+                grid_obj.select(i, j)
+            if finished:
+                solve_mode = False
+                grid_obj.reset_candidates()
+
+        # Update the parts of the game screen that changed, timing how long
+        # that takes while the debug overlay is shown.
+        if sudoku_stats.enabled:
+            redraw_start = time.perf_counter()
+            dirty_rects = redraw_window(grid_obj, play_time, errors, solve_button, drawn, hint)
+            dirty_rects.append(draw_debug())
+            update_start = time.perf_counter()
+            pygame.display.update(dirty_rects)
+            sudoku_stats.record_frame(update_start - redraw_start, time.perf_counter() - update_start)
+        else:
+            pygame.display.update(redraw_window(grid_obj, play_time, errors, solve_button, drawn, hint))
+
+        # Save the game every so often, in the background.
+        if not given_up and time.time() - last_save >= AUTOSAVE_INTERVAL:
+            autosave(grid_obj.to_snapshot(time.time() - start, errors))
+            last_save = time.time()
+
+        # If game is completed, remain at end screen until exit.
+        if grid_obj.is_finished():
+            running = False
+            given_up = True
+            delete_save()
+            end_screen = True
+            while end_screen:
+                for end_event in wait_for_events():
+                    if end_event.type == pygame.QUIT:
+                        end_screen = False
+                    if end_event.type == pygame.KEYDOWN:
+                        if end_event.key == pygame.K_ESCAPE:
+                            end_screen = False
+
+        # Sleep until the next input, or until the timer shows the next
+        # second, unless solve mode is animating the board or a move is
+        # being checked.
+        if running:
+            events = wait_for_events(solve_mode or check is not None, ms_until_next_second(start))
+
+    # A move still being checked is dropped.
+    if check is not None:
+        check.cancel()
+    pygame.display.set_caption("Sudoku")
+
+    # Leaving a game unfinished saves it to be resumed later.
+    if not given_up:
+        finish_saving()
+        write_save(grid_obj.to_snapshot(time.time() - start, errors))
+
+    # Keep what the debug overlay showed, for looking into slow frames or a
+    # stuck solver after the fact, and give the menus back their window size.
+    if sudoku_stats.enabled:
+        try:
+            sudoku_stats.save_report()
+        except OSError:
+            pass
+        sudoku_stats.disable()
+        set_screen()
+
+
+# Opens the game window and goes to the main menu.
+def run():
+    global clock, puzzle_pool
+    pygame.font.init()
+    set_screen()
+    clock = pygame.time.Clock()
+    # Nothing reacts to mouse movement, so it shouldn't wake the idle screens.
+    pygame.event.set_blocked(pygame.MOUSEMOTION)
+    # Keep puzzles ready in the background for each difficulty.
+    puzzle_pool = PuzzlePool()
+    puzzle_pool.start()
+    main_menu()
+    puzzle_pool.stop()
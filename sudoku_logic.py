@@ -0,0 +1,331 @@
+# sudoku_logic.py
+
+# Logical solver that works through a puzzle with the techniques a person
+# would use, keeping track of which ones it needed. The hardest technique a
+# puzzle needs says much more about how hard it is than its number of clues.
+from math import isqrt
+
+from sudoku_core import SYMBOLS, board_units, solve
+
+# Constants
+# Techniques in the order they are tried, simplest first, with the grade of
+# a puzzle that needs them.
+TECHNIQUES = [
+    ("naked single", "Easy"),
+    ("hidden single", "Easy"),
+    ("pointing", "Medium"),
+    ("claiming", "Medium"),
+    ("naked pair", "Hard"),
+    ("hidden pair", "Hard"),
+    ("x-wing", "Expert"),
+]
+# Grades from easiest to hardest. Puzzles that logic alone can't finish, so
+# the solver has to fall back on guessing with backtracking, are graded Evil.
+GRADES = ["Easy", "Medium", "Hard", "Expert", "Evil"]
+BACKTRACKING = "backtracking"
+
+
+# LogicSolver keeps the pencil-mark candidates of every empty cell and
+# applies one technique at a time to fill in cells or rule candidates out.
+class LogicSolver:
+    # Starts from the given candidate bitmasks, indexed like self.values,
+    # when they are already known, instead of working them out.
+    def __init__(self, board, candidates=None):
+        self.size = len(board)
+        self.box_size = isqrt(self.size)
+        self.full = (1 << self.size) - 1
+        self.row_units, self.col_units, self.box_units, self.peers = board_units(self.size)
+        self.units = self.row_units + self.col_units + self.box_units
+        # self.values is the board flattened row by row, self.candidates the
+        # bitmask of digits each cell could still take (0 for filled cells).
+        self.values = [num for row in board for num in row]
+        # self.broken is set once the board is found to have no solution.
+        self.broken = False
+        # self.counts tracks how many times each technique was applied.
+        self.counts = {}
+        if candidates is not None:
+            self.candidates = list(candidates)
+        else:
+            self.candidates = [self.full if num == 0 else 0 for num in self.values]
+            for index, num in enumerate(self.values):
+                if num != 0:
+                    bit = 1 << (num - 1)
+                    for peer in self.peers[index]:
+                        if self.values[peer] == num:
+                            self.broken = True
+                        self.candidates[peer] &= ~bit
+        self.techniques = [
+            ("naked single", self.naked_single),
+            ("hidden single", self.hidden_single),
+            ("pointing", self.pointing),
+            ("claiming", self.claiming),
+            ("naked pair", self.naked_pair),
+            ("hidden pair", self.hidden_pair),
+            ("x-wing", self.x_wing),
+        ]
+
+    # Writes num into the cell and removes it from the candidates of its peers.
+    def place(self, index, num):
+        bit = 1 << (num - 1)
+        self.values[index] = num
+        self.candidates[index] = 0
+        for peer in self.peers[index]:
+            self.candidates[peer] &= ~bit
+
+    # Removes the digits in mask from the candidates of the given cells.
+    # Returns whether any candidate was actually removed.
+    def eliminate(self, cells, mask):
+        removed = False
+        for index in cells:
+            if self.candidates[index] & mask:
+                self.candidates[index] &= ~mask
+                removed = True
+        return removed
+
+    # Applies the simplest technique that makes progress. Returns its name,
+    # or None if none of them apply (or the board turned out to be broken).
+    def step(self):
+        if self.broken:
+            return None
+        for name, technique in self.techniques:
+            if technique():
+                self.counts[name] = self.counts.get(name, 0) + 1
+                return name
+            if self.broken:
+                return None
+        return None
+
+    # Applies techniques until the board is full or none of them apply.
+    # Returns whether the board was completed by logic alone.
+    def run(self):
+        while self.step():
+            pass
+        return not self.broken and 0 not in self.values
+
+    # Returns the board in its current state, as a 2-D list.
+    def board(self):
+        size = self.size
+        return [self.values[row * size:(row + 1) * size] for row in range(size)]
+
+    # Returns (index, num) of a cell with a single candidate left, or None.
+    # Finding an empty cell without any candidates breaks the board.
+    def find_naked_single(self):
+        for index, mask in enumerate(self.candidates):
+            if mask and mask & (mask - 1) == 0:
+                return index, mask.bit_length()
+            if mask == 0 and self.values[index] == 0:
+                self.broken = True
+                return None
+        return None
+
+    # Returns (index, num) of the only cell in a unit that can take num, or
+    # None. A digit with nowhere left to go in a unit breaks the board.
+    def find_hidden_single(self):
+        for unit in self.units:
+            placed = 0
+            once = 0
+            more = 0
+            for index in unit:
+                mask = self.candidates[index]
+                more |= once & mask
+                once |= mask
+                if self.values[index]:
+                    placed |= 1 << (self.values[index] - 1)
+            if (once | placed) != self.full:
+                self.broken = True
+                return None
+            single = once & ~more
+            if single:
+                bit = single & -single
+                num = bit.bit_length()
+                for index in unit:
+                    if self.candidates[index] & bit:
+                        return index, num
+        return None
+
+    def naked_single(self):
+        found = self.find_naked_single()
+        if found:
+            self.place(*found)
+        return found is not None
+
+    def hidden_single(self):
+        found = self.find_hidden_single()
+        if found:
+            self.place(*found)
+        return found is not None
+
+    # Returns the number of the sub-grid holding the cell.
+    def box_of(self, index):
+        row, col = divmod(index, self.size)
+        return (row // self.box_size) * self.box_size + col // self.box_size
+
+    # Pointing: when a digit's candidates in a sub-grid all lie in one row
+    # or column, the digit can be ruled out of the rest of that row or column.
+    def pointing(self):
+        for box in self.box_units:
+            for num in range(1, self.size + 1):
+                bit = 1 << (num - 1)
+                cells = [index for index in box if self.candidates[index] & bit]
+                if len(cells) < 2:
+                    continue
+                rows = set(index // self.size for index in cells)
+                cols = set(index % self.size for index in cells)
+                if len(rows) == 1:
+                    line = self.row_units[rows.pop()]
+                elif len(cols) == 1:
+                    line = self.col_units[cols.pop()]
+                else:
+                    continue
+                if self.eliminate([index for index in line if index not in box], bit):
+                    return True
+        return False
+
+    # Claiming: when a digit's candidates in a row or column all lie in one
+    # sub-grid, the digit can be ruled out of the rest of that sub-grid.
+    def claiming(self):
+        for line in self.row_units + self.col_units:
+            for num in range(1, self.size + 1):
+                bit = 1 << (num - 1)
+                cells = [index for index in line if self.candidates[index] & bit]
+                if len(cells) < 2:
+                    continue
+                boxes = set(self.box_of(index) for index in cells)
+                if len(boxes) != 1:
+                    continue
+                box = self.box_units[boxes.pop()]
+                if self.eliminate([index for index in box if index not in line], bit):
+                    return True
+        return False
+
+    # Naked pair: two cells of a unit with the same two candidates take both
+    # of those digits, so they can be ruled out of the rest of the unit.
+    def naked_pair(self):
+        for unit in self.units:
+            seen = set()
+            for index in unit:
+                mask = self.candidates[index]
+                if mask.bit_count() != 2:
+                    continue
+                if mask in seen:
+                    others = [other for other in unit if self.candidates[other] != mask]
+                    if self.eliminate(others, mask):
+                        return True
+                seen.add(mask)
+        return False
+
+    # Hidden pair: two digits that can only go in the same two cells of a
+    # unit must take those cells, so every other candidate of them goes.
+    def hidden_pair(self):
+        for unit in self.units:
+            places = {}
+            for num in range(1, self.size + 1):
+                bit = 1 << (num - 1)
+                cells = tuple(index for index in unit if self.candidates[index] & bit)
+                if len(cells) == 2:
+                    places.setdefault(cells, []).append(bit)
+            for cells, bits in places.items():
+                if len(bits) == 2:
+                    pair = bits[0] | bits[1]
+                    if self.eliminate(cells, self.full & ~pair):
+                        return True
+        return False
+
+    # X-wing: when a digit can only go in the same two columns of two rows,
+    # it takes one corner in each, so it can be ruled out of the rest of
+    # those columns. The same goes with rows and columns swapped.
+    def x_wing(self):
+        for lines, crossing in ((self.row_units, self.col_units), (self.col_units, self.row_units)):
+            for num in range(1, self.size + 1):
+                bit = 1 << (num - 1)
+                pairs = {}
+                for position, line in enumerate(lines):
+                    spots = tuple(k for k, index in enumerate(line) if self.candidates[index] & bit)
+                    if len(spots) == 2:
+                        pairs.setdefault(spots, []).append(position)
+                for spots, positions in pairs.items():
+                    if len(positions) != 2:
+                        continue
+                    others = [index for spot in spots for k, index in enumerate(crossing[spot])
+                              if k not in positions]
+                    if self.eliminate(others, bit):
+                        return True
+        return False
+
+
+# Solves the board in place using logic first, and only falls back on
+# backtracking with solve() once the techniques run out. Returns whether the
+# board was solved, along with how many times each technique was used
+# (including BACKTRACKING if it was needed).
+def logic_solve(board):
+    solver = LogicSolver(board)
+    solved = solver.run()
+    counts = dict(solver.counts)
+    if solver.broken:
+        return False, counts
+    logic_board = solver.board()
+    if not solved:
+        counts[BACKTRACKING] = 1
+        solved = solve(logic_board)
+        if not solved:
+            return False, counts
+    for row, values in enumerate(logic_board):
+        board[row][:] = values
+    return True, counts
+
+
+# Grades how hard a puzzle is by the hardest technique it needs, one of
+# GRADES. Returns None if the puzzle can't be solved. The board is left as is.
+def grade_puzzle(board):
+    solved, counts = logic_solve([row[:] for row in board])
+    if not solved:
+        return None
+    if BACKTRACKING in counts:
+        return GRADES[-1]
+    grades = [GRADES.index(grade) for name, grade in TECHNIQUES if name in counts]
+    return GRADES[max(grades, default=0)]
+
+
+# Finds the next cell that logic forces on the board, using the techniques
+# in order and ruling candidates out with the harder ones until a single
+# turns up. Starts from the given candidate bitmasks if they are known.
+# Returns (row, col, num, reason), with reason saying why num is forced,
+# or None if logic can't force any cell yet.
+def find_hint(board, candidates=None):
+    solver = LogicSolver(board, candidates)
+    # Names of the techniques that ruled candidates out on the way.
+    used = []
+    while not solver.broken:
+        found = solver.find_naked_single()
+        if found:
+            index, num = found
+            reason = "only number left for the cell"
+        else:
+            found = solver.find_hidden_single()
+            if found:
+                index, num = found
+                reason = "only place left for " + SYMBOLS[num] + " in its " + hidden_unit(solver, index, num)
+        if found:
+            if used:
+                reason += " (after " + ", ".join(dict.fromkeys(used)) + ")"
+            row, col = divmod(index, solver.size)
+            return row, col, num, reason
+        for name, technique in solver.techniques[2:]:
+            if technique():
+                used.append(name)
+                break
+        else:
+            return None
+    return None
+
+
+# Returns the kind of unit, "row", "column" or "box", in which the cell is the
+# only place left for num.
+def hidden_unit(solver, index, num):
+    bit = 1 << (num - 1)
+    row, col = divmod(index, solver.size)
+    for kind, unit in (("row", solver.row_units[row]), ("column", solver.col_units[col]),
+                       ("box", solver.box_units[solver.box_of(index)])):
+        if all(other == index or not solver.candidates[other] & bit for other in unit):
+            return kind
+    return "row, column or box"
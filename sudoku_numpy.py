@@ -0,0 +1,150 @@
+# sudoku_numpy.py
+
+# Batched board checks with NumPy: validity, conflicting cells, candidate
+# bitmasks and naked-single propagation for a whole (N, size, size) stack of
+# boards at once, in array operations rather than a Python loop per cell.
+# NumPy is optional, it is only needed once this module is imported, see
+# the check command and solve --prefilter in Sudoku.py.
+from math import isqrt
+
+import numpy as np
+
+from sudoku_core import SYMBOL_VALUES, Board
+
+# Constants
+# Status of each board after propagate_singles().
+OPEN = 0
+SOLVED = 1
+BROKEN = 2
+# The number each symbol byte of a Board stands for, as an array to look
+# a whole stack of Board bytes up in at once.
+SYMBOL_NUMBERS = np.array(SYMBOL_VALUES, dtype=np.uint8)
+
+
+# Returns the boards stacked into an (N, size, size) array. Takes a list of
+# 2-D list boards or Boards of the same size, or an array that is already
+# stacked. Boards are read straight from their bytes.
+def to_array(boards):
+    if isinstance(boards, list) and boards and isinstance(boards[0], Board):
+        size = boards[0].size
+        codes = np.frombuffer(b"".join(board.cells for board in boards), dtype=np.uint8)
+        array = SYMBOL_NUMBERS[codes].reshape(len(boards), size, size)
+    else:
+        array = np.asarray(boards, dtype=np.uint8)
+    if array.ndim != 3 or array.shape[1] != array.shape[2] or isqrt(array.shape[1]) ** 2 != array.shape[1]:
+        raise ValueError("boards must stack into an (N, size, size) array with size a square number")
+    return array
+
+
+# Returns a (N, size, size) array with the bit of every cell's number set,
+# bit num - 1 standing for num like the bitmask engine, and 0 for empty cells.
+def cell_bits(array):
+    return np.where(array > 0, np.left_shift(np.uint32(1), array.astype(np.uint32) - 1), np.uint32(0))
+
+
+# Returns the bits of every row, column and sub-grid of every board
+# as (N, size, size) arrays: rows[n, row], cols[n, col] and boxes[n, box] each
+# hold the bits of the cells in that unit, in order.
+def unit_bits(bits):
+    count, size = bits.shape[0], bits.shape[1]
+    box_size = isqrt(size)
+    boxes = bits.reshape(count, box_size, box_size, box_size, box_size).transpose(0, 1, 3, 2, 4)
+    return bits, bits.transpose(0, 2, 1), boxes.reshape(count, size, size)
+
+
+# Spreads a (N, size) array of values for each sub-grid out over the cells,
+# giving a (N, size, size) array.
+def spread_boxes(values):
+    count, size = values.shape
+    box_size = isqrt(size)
+    return values.reshape(count, box_size, box_size).repeat(box_size, axis=1).repeat(box_size, axis=2)
+
+
+# Returns the bits of the numbers found in every row, column and sub-grid,
+# as three (N, size) arrays.
+def unit_used(bits):
+    return tuple(np.bitwise_or.reduce(units, axis=2) for units in unit_bits(bits))
+
+
+# Returns the bits of the numbers repeated in every row, column and
+# sub-grid, as three (N, size) arrays.
+def unit_repeated(bits):
+    repeated = []
+    for units in unit_bits(bits):
+        seen = np.zeros(units.shape[:2], dtype=np.uint32)
+        twice = np.zeros(units.shape[:2], dtype=np.uint32)
+        for k in range(units.shape[2]):
+            twice |= seen & units[:, :, k]
+            seen |= units[:, :, k]
+        repeated.append(twice)
+    return tuple(repeated)
+
+
+# Returns a (N, size, size) bool array marking the filled cells whose number
+# is repeated in their row, column or sub-grid.
+def batch_conflicts(boards):
+    bits = cell_bits(to_array(boards))
+    rows, cols, boxes = unit_repeated(bits)
+    return (bits & (rows[:, :, None] | cols[:, None, :] | spread_boxes(boxes))) != 0
+
+
+# Returns a (N,) bool array telling which boards break no rule. Empty cells
+# are fine, this checks the filled ones don't clash, not that there's a solution.
+def batch_valid(boards):
+    bits = cell_bits(to_array(boards))
+    valid = np.ones(bits.shape[0], dtype=bool)
+    # A unit holds a number twice exactly when adding up its bits carries
+    # past what OR-ing them together gives.
+    for units in unit_bits(bits):
+        valid &= (units.sum(axis=2, dtype=np.uint64) == np.bitwise_or.reduce(units, axis=2)).all(axis=1)
+    return valid
+
+
+# Returns the (N, size, size) candidate bitmasks of an array of boards.
+def candidate_masks(array):
+    size = array.shape[1]
+    rows, cols, boxes = unit_used(cell_bits(array))
+    free = np.uint32((1 << size) - 1) & ~(rows[:, :, None] | cols[:, None, :] | spread_boxes(boxes))
+    return np.where(array == 0, free, np.uint32(0))
+
+
+# Returns a (N, size, size) array with the candidate bitmask of every cell,
+# bit num - 1 standing for num like the bitmask engine, and 0 for filled cells.
+def batch_candidates(boards):
+    return candidate_masks(to_array(boards))
+
+
+# Fills in naked singles, cells with a single candidate left, on every board
+# of the batch at once, round after round until no board has any left.
+# Returns the filled-in boards as a new array, along with a (N,) array of
+# each board's status: SOLVED, BROKEN (a rule is broken, or an empty cell
+# has no candidates) or OPEN (needs more than naked singles).
+def propagate_singles(boards):
+    array = to_array(boards).copy()
+    status = np.full(array.shape[0], OPEN, dtype=np.uint8)
+    valid = batch_valid(array)
+    status[~valid] = BROKEN
+    # Only boards still open are worked on each round.
+    active = np.flatnonzero(valid)
+    while active.size:
+        current = array[active]
+        masks = candidate_masks(current)
+        empty = current == 0
+        # A mask with one bit set is a single, one with none left a dead end.
+        single = empty & (masks != 0) & ((masks & (masks - np.uint32(1))) == 0)
+        broken = (empty & (masks == 0)).any(axis=(1, 2))
+        status[active[broken]] = BROKEN
+        status[active[~empty.any(axis=(1, 2))]] = SOLVED
+        single &= ~broken[:, None, None]
+        progress = single.any(axis=(1, 2))
+        if not progress.any():
+            break
+        # The single bit's position gives the number, exactly, as a power of two.
+        current[single] = np.log2(masks[single]).astype(np.uint8) + 1
+        array[active] = current
+        # Two peers given the same single break a rule, so only boards that
+        # are still valid carry on to the next round.
+        progress &= batch_valid(current)
+        status[active[~progress & single.any(axis=(1, 2))]] = BROKEN
+        active = active[progress]
+    return array, status
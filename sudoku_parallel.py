@@ -0,0 +1,151 @@
+# sudoku_parallel.py
+
+# Counting the solutions of under-constrained boards across every CPU. The
+# search tree is split a few levels down, by filling in the most
+# constrained cells every way they can go, into pieces that are counted
+# independently by a pool of worker processes. There are many more pieces
+# than workers, and each worker takes the next piece as soon as it's done
+# with one, so a worker that drew small pieces picks up the slack of one
+# that drew a big piece. The workers add their counts to one shared total
+# as they go, and all stop as soon as it passes the limit.
+import multiprocessing
+import time
+from math import inf
+
+import sudoku_core
+from sudoku_core import candidate_state, iter_solutions, mask_digits, most_constrained, set_engine
+
+# Constants
+# Pieces the search is split into for each worker, unless a depth is given.
+PIECES_PER_JOB = 16
+# Solutions a worker counts on its own before adding them to the shared total.
+FLUSH_SOLUTIONS = 256
+# Seconds between progress reports while pieces are being counted.
+PROGRESS_INTERVAL = 0.5
+
+# Globals
+# Set up in each worker process by init_worker(): the shared total of
+# solutions counted, the flag that stops every worker, and the limit.
+shared_count = None
+stop_flag = None
+count_limit = inf
+
+
+# Splits the board's search tree into pieces: boards with the most
+# constrained empty cell filled in every way it can go, then the same for
+# each of those, depth levels down. Without a depth, it goes down until
+# there are at least the given number of pieces. Returns the pieces, along
+# with the number of solutions found on the way, by boards filling up before
+# reaching the bottom. A board that breaks a rule has no pieces.
+def split_board(board, depth=None, pieces=1):
+    if not candidate_state(board):
+        return [], 0
+    frontier = [[row[:] for row in board]]
+    solved = 0
+    level = 0
+    while frontier and (level < depth if depth is not None else len(frontier) < pieces):
+        next_frontier = []
+        for piece in frontier:
+            empty_cells, row_free, col_free, box_free = candidate_state(piece)
+            if not empty_cells:
+                solved += 1
+                continue
+            mask = most_constrained(empty_cells, 0, row_free, col_free, box_free)
+            row, col, _ = empty_cells[0]
+            for num in mask_digits(mask):
+                child = [values[:] for values in piece]
+                child[row][col] = num
+                next_frontier.append(child)
+        frontier = next_frontier
+        level += 1
+    return frontier, solved
+
+
+# Sets up a counting worker process to use the chosen solving engine, and
+# to add its counts to the shared total, stopping the others through the
+# stop flag once the total passes the limit.
+def init_worker(engine, count, stop, limit):
+    global shared_count, stop_flag, count_limit
+    set_engine(engine)
+    shared_count = count
+    stop_flag = stop
+    count_limit = limit
+
+
+# Adds solutions counted by this worker to the shared total, setting the stop
+# flag once the total passes the limit.
+def add_count(found):
+    with shared_count.get_lock():
+        shared_count.value += found
+        if shared_count.value > count_limit:
+            stop_flag.set()
+
+
+# Worker: counts the solutions of a piece, passed with the time.monotonic()
+# deadline (or None) as a (board, deadline) pair, adding them to the shared
+# total every FLUSH_SOLUTIONS solutions so the others see how far along the
+# count is. Stops once the stop flag is set or the deadline passes. Returns
+# whether the piece was counted to the end.
+def count_piece(job):
+    board, deadline = job
+    time_budget = None if deadline is None else deadline - time.monotonic()
+    if stop_flag.is_set() or time_budget is not None and time_budget <= 0:
+        return False
+    found = 0
+    search = iter_solutions(board, None, time_budget, stop=stop_flag)
+    for _ in search:
+        found += 1
+        if found == FLUSH_SOLUTIONS:
+            add_count(found)
+            found = 0
+            if stop_flag.is_set():
+                return False
+    add_count(found)
+    return not search.cut_short
+
+
+# Counts the solutions of a board like count_solutions(), splitting the
+# search across jobs worker processes (one per CPU by default). Stops once
+# more than limit solutions have been counted (no limit by default) or
+# time_budget seconds have gone by. progress, if given, is called with the
+# running count, the pieces counted and the number of pieces every
+# PROGRESS_INTERVAL seconds and each time a piece is done. Returns the
+# count, at most limit, and whether it's complete, that is, counting didn't
+# stop at the limit or time budget.
+def parallel_count_solutions(board, limit=None, jobs=None, depth=None, time_budget=None, progress=None,
+                             engine=None):
+    deadline = None if time_budget is None else time.monotonic() + time_budget
+    limit = inf if limit is None else limit
+    jobs = jobs or multiprocessing.cpu_count()
+    pieces, solved = split_board(board, depth, jobs * PIECES_PER_JOB)
+    # Counting stopped short at the limit only once a solution past it is
+    # found, so the workers stop once the total goes over the limit.
+    if solved > limit:
+        return limit, False
+    count = multiprocessing.Value("q", solved)
+    stop = multiprocessing.Event()
+    complete = True
+    pool = multiprocessing.Pool(jobs, init_worker, (engine or sudoku_core.current_engine, count, stop, limit))
+    try:
+        # Pieces are handed out one at a time, to whichever worker is free.
+        # Past the deadline, the pieces left stop almost at once, so their
+        # results all come in shortly after it.
+        results = pool.imap_unordered(count_piece, [(piece, deadline) for piece in pieces], 1)
+        done = 0
+        while done < len(pieces) and not stop.is_set():
+            try:
+                finished = results.next(PROGRESS_INTERVAL)
+            except multiprocessing.TimeoutError:
+                finished = None
+            if finished is not None:
+                done += 1
+                complete = complete and finished
+            if progress:
+                progress(min(count.value, limit), done, len(pieces))
+        if count.value > limit:
+            return limit, False
+        return count.value, complete
+    finally:
+        # Workers still counting pieces that are no longer needed are stopped.
+        pool.terminate()
+        pool.join()
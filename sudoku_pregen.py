@@ -0,0 +1,153 @@
+# sudoku_pregen.py
+
+# Background puzzle generation, so that starting a game never has to wait
+# for a new puzzle to be generated.
+import json
+import os
+import random
+import threading
+from collections import deque
+
+from sudoku_core import ROWS, EASY, MEDIUM, HARD, seeded_puzzle, parse_puzzle, format_puzzle
+
+# Constants
+# Number of ready puzzles kept for each number of starting clues.
+POOL_SIZE = 5
+# File the ready puzzles are saved to between launches.
+CACHE_PATH = os.path.join(os.path.expanduser("~"), ".sudoku_puzzles.json")
+# Seeds of the puzzles are drawn from range(SEED_RANGE).
+SEED_RANGE = 2 ** 32
+
+
+# PuzzlePool keeps a bounded queue of ready puzzles for each of the preset
+# difficulties on a 9x9 board, plus the most recently wanted other board size
+# and number of clues. Each puzzle is the seeded_puzzle() of a random seed,
+# kept along with it, so any game can be made again from its seed. A
+# background thread tops the queues up, generating the base puzzle of each
+# seed's family, and they are saved to a small cache file so they survive
+# between launches.
+class PuzzlePool:
+    def __init__(self, presets=(EASY, MEDIUM, HARD), size=POOL_SIZE, cache_path=CACHE_PATH):
+        self.presets = presets
+        self.size = size
+        self.cache_path = cache_path
+        # self.queues maps a (board size, number of starting clues) key to a
+        # deque of ready (seed, (board, solution)) puzzles.
+        self.queues = {(ROWS, clues): deque() for clues in presets}
+        # self.custom is the custom (board size, clues) key being kept, if any.
+        self.custom = None
+        self.lock = threading.Lock()
+        # self.wake is set to wake up the background thread when a queue
+        # needs topping up.
+        self.wake = threading.Event()
+        self.running = False
+        self.thread = None
+        self.load()
+
+    # Starts topping up the queues in the background.
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.fill, daemon=True)
+        self.thread.start()
+
+    # Stops the background thread and saves the ready puzzles to the cache file.
+    def stop(self):
+        self.running = False
+        self.wake.set()
+        self.save()
+
+    # Makes sure puzzles of the given board size and number of clues are
+    # being kept ready. Only one custom board size and number of clues is
+    # kept, wanting another replaces it.
+    def want(self, clues, board_size=ROWS):
+        key = (board_size, clues)
+        with self.lock:
+            if key not in self.queues:
+                if self.custom is not None:
+                    del self.queues[self.custom]
+                self.custom = key
+                self.queues[key] = deque()
+        self.wake.set()
+
+    # Returns a ready (seed, (board, solution)) puzzle of the given board size
+    # and number of clues, or None if there isn't one yet. Either way the queue
+    # is topped up in the background.
+    def take(self, clues, board_size=ROWS):
+        self.want(clues, board_size)
+        with self.lock:
+            queue = self.queues.get((board_size, clues))
+            puzzle = queue.popleft() if queue else None
+        self.wake.set()
+        return puzzle
+
+    # Returns the (board size, clues) key of a queue that isn't full, or None
+    # if all are.
+    def next_wanted(self):
+        with self.lock:
+            for key, queue in self.queues.items():
+                if len(queue) < self.size:
+                    return key
+        return None
+
+    # Background thread: generates puzzles for whichever queue isn't full,
+    # and sleeps once they all are.
+    def fill(self):
+        while self.running:
+            self.wake.clear()
+            key = self.next_wanted()
+            if key is None:
+                self.wake.wait()
+                continue
+            board_size, clues = key
+            seed = random.randrange(SEED_RANGE)
+            puzzle = seeded_puzzle(seed, clues, board_size)
+            with self.lock:
+                queue = self.queues.get(key)
+                if queue is not None and len(queue) < self.size:
+                    queue.append((seed, puzzle))
+
+    # Loads ready puzzles saved by a previous launch, keyed by "size:clues",
+    # each as [seed, board line, solution line]. A missing or damaged cache
+    # file just means starting with empty queues.
+    def load(self):
+        try:
+            with open(self.cache_path) as file:
+                saved = json.load(file)
+        except (OSError, ValueError):
+            return
+        if not isinstance(saved, dict):
+            return
+        for name, puzzles in saved.items():
+            board_size, _, clues = name.partition(":")
+            if not board_size.isdigit() or not clues.isdigit() or not isinstance(puzzles, list):
+                continue
+            key = (int(board_size), int(clues))
+            if key not in self.queues:
+                if self.custom is not None:
+                    continue
+                self.custom = key
+                self.queues[key] = deque()
+            for saved_puzzle in puzzles[:self.size]:
+                if not isinstance(saved_puzzle, list) or len(saved_puzzle) != 3:
+                    continue
+                seed, board, solution = saved_puzzle
+                if not isinstance(seed, int) or not isinstance(board, str) or not isinstance(solution, str):
+                    continue
+                board, solution = parse_puzzle(board), parse_puzzle(solution)
+                if board and solution and len(board) == key[0]:
+                    self.queues[key].append((seed, (board, solution)))
+
+    # Saves the ready puzzles to the cache file. The file is written next to
+    # the old one and swapped in, so an interrupted save can't damage it.
+    def save(self):
+        with self.lock:
+            saved = {str(board_size) + ":" + str(clues):
+                     [[seed, format_puzzle(board), format_puzzle(solution)] for seed, (board, solution) in queue]
+                     for (board_size, clues), queue in self.queues.items()}
+        temp_path = self.cache_path + ".tmp"
+        try:
+            with open(temp_path, "w") as file:
+                json.dump(saved, file)
+            os.replace(temp_path, self.cache_path)
+        except OSError:
+            pass
@@ -0,0 +1,339 @@
+# sudoku_server.py
+
+# A small HTTP/JSON service on localhost that solves, validates, counts the
+# solutions of and generates puzzles, for tools that need the engine without
+# starting a Python process (and a search engine) of their own every time.
+# Uses only the standard library. Requests arriving together are gathered
+# into micro-batches, split across a pool of worker processes that stays
+# warm between requests. See Sudoku.py serve.
+import asyncio
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from sudoku_core import (BOARD_SIZES, candidate_state, iter_solutions, set_engine, generate_puzzle,
+                         seeded_puzzle, parse_puzzle, format_puzzle)
+
+# Constants
+HOST = "127.0.0.1"
+PORT = 8765
+# Most requests gathered into one batch for the worker pool, and the most
+# seconds the first request of a batch waits for others to join it.
+BATCH_SIZE = 32
+BATCH_WINDOW = 0.002
+# Seconds a request may take before it's answered with 504. Each job carries
+# the time.monotonic() deadline of its request to the worker, so searches
+# stop by then, and jobs the workers only reach after it are skipped.
+REQUEST_TIMEOUT = 10.0
+# Most requests waiting on the worker pool at once, counting ones that timed
+# out but are still being worked on. Past this, requests are turned away
+# with 503 until some finish.
+MAX_PENDING = 256
+# Largest request body accepted, in bytes.
+MAX_BODY = 64 * 1024
+# Seconds an idle keep-alive connection is kept open.
+IDLE_TIMEOUT = 30.0
+# Most solutions a count request counts, unless it asks for fewer.
+COUNT_LIMIT = 1000
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+           500: "Internal Server Error", 503: "Service Unavailable", 504: "Gateway Timeout"}
+
+
+# Raised by SolverService.submit() when too many requests are waiting.
+class Overloaded(Exception):
+    pass
+
+
+# Sets up a worker process to use the chosen solving engine. Forked workers
+# start out with the server's random state, so they're reseeded to keep
+# them from generating the same puzzles.
+def init_worker(engine):
+    set_engine(engine)
+    random.seed()
+
+
+# Response for a job the worker only reached after its deadline. The request
+# has been answered with 504 by then, so it's thrown away.
+LATE = (504, {"error": "request timed out before a worker reached it"})
+
+
+# Returns the seconds left until a job's deadline.
+def time_left(job):
+    return job["deadline"] - time.monotonic()
+
+
+# Worker: solves a puzzle line by its deadline. Returns the (status,
+# response) to send.
+def solve_job(job):
+    budget = time_left(job)
+    if budget <= 0:
+        return LATE
+    search = iter_solutions(parse_puzzle(job["puzzle"]), 1, budget)
+    solution = next(search, None)
+    if solution is not None:
+        return 200, {"solved": True, "solution": format_puzzle(solution)}
+    if search.cut_short:
+        return 504, {"error": "no solution found in time"}
+    return 200, {"solved": False}
+
+
+# Worker: counts the solutions of a puzzle line, up to its limit and by its
+# deadline. complete is false when counting stopped short, which it only
+# did at the limit if a solution past it turned up.
+def count_job(job):
+    budget = time_left(job)
+    if budget <= 0:
+        return LATE
+    search = iter_solutions(parse_puzzle(job["puzzle"]), job["limit"] + 1, budget)
+    found = sum(1 for _ in search)
+    stopped = found > job["limit"] or search.cut_short
+    return 200, {"count": min(found, job["limit"]), "complete": not stopped}
+
+
+# Worker: generates a puzzle, or the seeded puzzle for a seed. Generating
+# can't stop part way, so it's only started if the deadline hasn't passed.
+def generate_job(job):
+    if time_left(job) <= 0:
+        return LATE
+    if job["seed"] is not None:
+        board, solution = seeded_puzzle(job["seed"], job["clues"], job["size"])
+    else:
+        board, solution = generate_puzzle(job["clues"], job["size"])
+    return 200, {"puzzle": format_puzzle(board), "solution": format_puzzle(solution)}
+
+
+# Worker jobs by request path.
+WORKERS = {"/solve": solve_job, "/count": count_job, "/generate": generate_job}
+
+
+# Worker: runs a batch of jobs of one kind. Returns their results in order.
+def run_batch(path, jobs):
+    return [WORKERS[path](job) for job in jobs]
+
+
+# Reads the board out of a request, returning the puzzle line. Raises
+# ValueError if it's missing or malformed.
+def request_puzzle(request):
+    line = request.get("puzzle")
+    if not isinstance(line, str) or not parse_puzzle(line):
+        raise ValueError("puzzle must be a line of 81, 256 or 625 characters")
+    return line.strip()
+
+
+# Reads a whole number out of a request, or its default if it's not given.
+# Raises ValueError if it's not a whole number from low to high.
+def request_int(request, name, default, low, high):
+    value = request.get(name, default)
+    if value is default:
+        return value
+    if not isinstance(value, int) or isinstance(value, bool) or not low <= value <= high:
+        raise ValueError(name + " must be a whole number from " + str(low) + " to " + str(high))
+    return value
+
+
+# SolverService answers the requests: validation right away, since it only
+# takes a scan of the board, and everything else through micro-batches on
+# the worker pool, one queue and dispatcher per kind of request. Each batch
+# is split into about one chunk per worker, so the workers share it.
+class SolverService:
+    def __init__(self, jobs=None, engine=None, timeout=REQUEST_TIMEOUT, max_pending=MAX_PENDING):
+        self.engine = engine
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self.pool = ProcessPoolExecutor(jobs, initializer=init_worker, initargs=(engine,))
+        # self.workers is the number of worker processes in the pool.
+        self.workers = jobs or os.cpu_count() or 1
+        # self.queues holds the (job, future) requests waiting to be batched, by path.
+        self.queues = {}
+        self.dispatchers = []
+        # self.pending counts the jobs queued for or running on the pool.
+        self.pending = 0
+
+    # Starts a dispatcher for each kind of request. Runs in the event loop.
+    def start(self):
+        for path in WORKERS:
+            self.queues[path] = asyncio.Queue()
+            self.dispatchers.append(asyncio.create_task(self.dispatch(path)))
+
+    # Stops the dispatchers and the worker pool.
+    def stop(self):
+        for dispatcher in self.dispatchers:
+            dispatcher.cancel()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    # Queues a job for the worker pool and waits for its (status, response),
+    # up to the job's deadline. The job stays pending until the pool gives
+    # its result back, or it's dropped unsent, even if the request times out
+    # first, so max_pending bounds the work really piled up on the pool.
+    # Raises Overloaded if too many jobs are already pending, and
+    # asyncio.TimeoutError if the deadline passes.
+    async def submit(self, path, job):
+        if self.pending >= self.max_pending:
+            raise Overloaded()
+        future = asyncio.get_running_loop().create_future()
+        self.pending += 1
+        self.queues[path].put_nowait((job, future))
+        return await asyncio.wait_for(future, time_left(job))
+
+    # Dispatcher: takes the next request off the queue, waits up to
+    # BATCH_WINDOW for more to join it, and sends them to the pool split into
+    # a chunk per worker, each its own call, so they run side by side.
+    async def dispatch(self, path):
+        loop = asyncio.get_running_loop()
+        queue = self.queues[path]
+        while True:
+            batch = [await queue.get()]
+            end = loop.time() + BATCH_WINDOW
+            while len(batch) < BATCH_SIZE:
+                if queue.empty():
+                    remaining = end - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(queue.get(), remaining))
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    batch.append(queue.get_nowait())
+            # Requests that timed out while waiting aren't worth sending.
+            live = [(job, future) for job, future in batch if not future.done()]
+            self.pending -= len(batch) - len(live)
+            if not live:
+                continue
+            size = -(-len(live) // self.workers)
+            for start in range(0, len(live), size):
+                asyncio.create_task(self.run(path, live[start:start + size]))
+
+    # Runs a chunk of a batch on the pool and hands each request its result.
+    async def run(self, path, chunk):
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(self.pool, run_batch, path, [job for job, _ in chunk])
+        except Exception as error:
+            results = [(500, {"error": "worker failed: " + str(error)})] * len(chunk)
+        finally:
+            self.pending -= len(chunk)
+        for (_, future), result in zip(chunk, results):
+            if not future.done():
+                future.set_result(result)
+
+    # Answers a request. Returns its (status, response).
+    async def answer(self, method, path, body):
+        if path == "/health":
+            return 200, {"status": "ok", "engine": self.engine or "auto", "pending": self.pending}
+        if path != "/validate" and path not in WORKERS:
+            return 404, {"error": "unknown path " + path}
+        if method != "POST":
+            return 405, {"error": "use POST"}
+        try:
+            request = json.loads(body or b"{}")
+            if not isinstance(request, dict):
+                raise ValueError("request must be a JSON object")
+            job = self.make_job(path, request)
+        except ValueError as error:
+            return 400, {"error": str(error)}
+        if path == "/validate":
+            return 200, {"valid": candidate_state(parse_puzzle(job["puzzle"])) is not None}
+        try:
+            return await self.submit(path, job)
+        except Overloaded:
+            return 503, {"error": "too many requests waiting, try again shortly"}
+        except asyncio.TimeoutError:
+            return 504, {"error": "request took longer than " + format(self.timeout, "g") + " s"}
+
+    # Checks a request and returns the job for it, with the deadline the
+    # request has to be answered by. Raises ValueError if something in it is
+    # missing or wrong.
+    def make_job(self, path, request):
+        deadline = time.monotonic() + self.timeout
+        if path == "/generate":
+            size = request_int(request, "size", BOARD_SIZES[0], BOARD_SIZES[0], BOARD_SIZES[-1])
+            if size not in BOARD_SIZES:
+                raise ValueError("size must be one of " + ", ".join(map(str, BOARD_SIZES)))
+            clues = request_int(request, "clues", None, 0, size * size)
+            if clues is None:
+                raise ValueError("clues is needed")
+            return {"clues": clues, "size": size, "seed": request_int(request, "seed", None, 0, 2 ** 63),
+                    "deadline": deadline}
+        job = {"puzzle": request_puzzle(request), "deadline": deadline}
+        if path == "/count":
+            job["limit"] = request_int(request, "limit", COUNT_LIMIT, 1, COUNT_LIMIT)
+        return job
+
+    # Connection handler: reads HTTP/1.1 requests off the connection and
+    # answers each with JSON, keeping the connection open between them
+    # unless the client asks to close it.
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await asyncio.wait_for(reader.readline(), IDLE_TIMEOUT)
+                if not request_line:
+                    break
+                parts = request_line.decode("latin-1").split()
+                if len(parts) != 3:
+                    break
+                method, path, version = parts
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = headers.get("content-length", "0")
+                # Without a length it can trust, there's no telling where the
+                # next request starts, so the connection ends with the reply.
+                if not length.isdigit():
+                    await self.respond(writer, 400, {"error": "bad Content-Length header"}, False)
+                    break
+                length = int(length)
+                if length > MAX_BODY:
+                    await self.respond(writer, 413, {"error": "request body too large"}, False)
+                    break
+                body = await reader.readexactly(length) if length > 0 else b""
+                status, response = await self.answer(method, path.partition("?")[0], body)
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                await self.respond(writer, status, response, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    # Writes a JSON response.
+    async def respond(self, writer, status, response, keep_alive):
+        body = json.dumps(response).encode()
+        head = ("HTTP/1.1 " + str(status) + " " + REASONS[status] + "\r\n"
+                + "Content-Type: application/json\r\n"
+                + "Content-Length: " + str(len(body)) + "\r\n"
+                + "Connection: " + ("keep-alive" if keep_alive else "close") + "\r\n")
+        if status == 503:
+            head += "Retry-After: 1\r\n"
+        writer.write(head.encode("latin-1") + b"\r\n" + body)
+        await writer.drain()
+
+
+# Runs the service until interrupted.
+async def serve_forever(host, port, service):
+    service.start()
+    server = await asyncio.start_server(service.handle, host, port)
+    print("serving on http://" + host + ":" + str(port), flush=True)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.stop()
+
+
+# Starts the service on host and port. Returns the exit status once it's
+# stopped with Ctrl+C.
+def serve(host=HOST, port=PORT, jobs=None, engine=None, timeout=REQUEST_TIMEOUT, max_pending=MAX_PENDING):
+    service = SolverService(jobs, engine, timeout, max_pending)
+    try:
+        asyncio.run(serve_forever(host, port, service))
+    except KeyboardInterrupt:
+        pass
+    return 0
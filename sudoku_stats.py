@@ -0,0 +1,234 @@
+# sudoku_stats.py
+
+# Instrumentation for the solver and the game screen: search nodes, dead
+# ends, valid() calls and depth reached by the search, kept per solve(),
+# iter_solutions() and solve_steps() call and in total, plus the time each
+# game frame spends drawing and updating the display. Counting works by
+# swapping counting wrappers in for the engine's functions while it's
+# enabled, so the engine runs untouched, at full speed, while it's off.
+import json
+import os
+import threading
+import time
+from collections import deque
+
+import sudoku_core
+import sudoku_dlx
+
+# Constants
+# Number of recent search calls kept.
+HISTORY_SIZE = 50
+# File the game saves the report to when leaving a game with stats shown.
+REPORT_PATH = os.path.join(os.path.expanduser("~"), ".sudoku_stats.json")
+
+# Globals
+# Whether the counters are switched in, see enable().
+enabled = False
+# Running totals since the last reset().
+totals = {}
+# Per search call counters, for the most recent HISTORY_SIZE calls.
+calls = deque(maxlen=HISTORY_SIZE)
+# Frame timings since the last reset().
+frames = {}
+# The engine functions the counters wrap, saved while enabled.
+originals = {}
+# Only the thread that enabled the counters, and the threads added with
+# count_thread(), are counted, so puzzles being generated in the background
+# don't mix into the game's numbers.
+owner = None
+workers = set()
+
+
+# Sets every counter back to zero.
+def reset():
+    totals.update(nodes=0, dead_ends=0, valid_calls=0, max_depth=0, solve_calls=0, solve_ms=0.0)
+    calls.clear()
+    frames.update(count=0, redraw_ms=0.0, update_ms=0.0, max_redraw_ms=0.0, max_update_ms=0.0,
+                  last_redraw_ms=0.0, last_update_ms=0.0)
+
+
+# Switches the counting wrappers in for the engine's functions.
+def enable():
+    global enabled, owner
+    if enabled:
+        return
+    owner = threading.get_ident()
+    originals["most_constrained"] = sudoku_core.most_constrained
+    originals["valid"] = sudoku_core.valid
+    originals["smallest_column"] = sudoku_dlx.DancingLinks.smallest_column
+    originals["solve_steps"] = sudoku_core.solve_steps
+    originals["engines"] = dict(sudoku_core.ENGINES)
+    sudoku_core.most_constrained = counted_most_constrained
+    sudoku_core.valid = counted_valid
+    sudoku_dlx.DancingLinks.smallest_column = counted_smallest_column
+    sudoku_core.solve_steps = counted_search("solve_steps", "bitmask", originals["solve_steps"],
+                                             lambda args, found: all(map(all, args[0])))
+    for name, (solve, count, solutions) in originals["engines"].items():
+        sudoku_core.ENGINES[name] = (counted_solve(name, solve), count,
+                                     counted_search("iter_solutions", name, solutions, lambda args, found: found > 0))
+    enabled = True
+
+
+# Puts the engine's own functions back, the counters keep their values.
+def disable():
+    global enabled
+    if not enabled:
+        return
+    sudoku_core.most_constrained = originals["most_constrained"]
+    sudoku_core.valid = originals["valid"]
+    sudoku_dlx.DancingLinks.smallest_column = originals["smallest_column"]
+    sudoku_core.solve_steps = originals["solve_steps"]
+    sudoku_core.ENGINES.update(originals["engines"])
+    originals.clear()
+    enabled = False
+
+
+# Counts the searches of the calling thread too, until uncount_thread().
+# The game's SolverJob threads call it, since its searches run on them.
+def count_thread():
+    workers.add(threading.get_ident())
+
+
+# Stops counting the calling thread, see count_thread().
+def uncount_thread():
+    workers.discard(threading.get_ident())
+
+
+# Tells whether the calling thread's searches are counted.
+def counting():
+    ident = threading.get_ident()
+    return ident == owner or ident in workers
+
+
+# Counting most_constrained(): the bitmask searches call it once for every
+# node they visit, and it returns 0 at a dead end they have to back out of.
+def counted_most_constrained(empty_cells, depth, row_free, col_free, box_free):
+    mask = originals["most_constrained"](empty_cells, depth, row_free, col_free, box_free)
+    if counting():
+        totals["nodes"] += 1
+        if mask == 0:
+            totals["dead_ends"] += 1
+        if depth > totals["max_depth"]:
+            totals["max_depth"] = depth
+    return mask
+
+
+# Counting valid().
+def counted_valid(board, num, row, col):
+    if counting():
+        totals["valid_calls"] += 1
+    return originals["valid"](board, num, row, col)
+
+
+# Counting DancingLinks.smallest_column(), called once for every node of the
+# Dancing Links search with the number of placements made so far.
+def counted_smallest_column(self, depth=0):
+    col = originals["smallest_column"](self, depth)
+    if counting():
+        totals["nodes"] += 1
+        if self.sizes[col] == 0:
+            totals["dead_ends"] += 1
+        if depth > totals["max_depth"]:
+            totals["max_depth"] = depth
+    return col
+
+
+# Returns a counting version of an engine's solve function, which records
+# what each call cost in calls.
+def counted_solve(engine, solve):
+    def solve_counted(board, random=False):
+        if not counting():
+            return solve(board, random)
+        before = start_call()
+        start = time.perf_counter()
+        solved = solve(board, random)
+        record_call("solve", engine, solved, time.perf_counter() - start, before)
+        return solved
+    return solve_counted
+
+
+# Returns a counting version of a search that yields as it goes, an engine's
+# solutions function or solve_steps(), which records what each call cost in
+# calls once it runs out or is dropped. Only the time spent searching counts,
+# not the time the caller takes between steps, like the frames of the Solve!
+# animation. solved(args, found) tells whether the call solved its board,
+# given its arguments and the number of things it yielded. What the search
+# returns is passed on, so callers still learn whether it was cut short.
+def counted_search(function, engine, search, solved):
+    def search_counted(*args):
+        if not counting():
+            return (yield from search(*args))
+        before = start_call()
+        steps = search(*args)
+        found = 0
+        elapsed = 0.0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(steps)
+                except StopIteration as end:
+                    return end.value
+                finally:
+                    elapsed += time.perf_counter() - start
+                found += 1
+                yield item
+        finally:
+            steps.close()
+            record_call(function, engine, solved(args, found), elapsed, before)
+    return search_counted
+
+
+# Starts counting a search call. Returns the totals from before it, for
+# record_call().
+def start_call():
+    before = dict(totals)
+    totals["max_depth"] = 0
+    return before
+
+
+# Records what a search call to function cost in calls, given whether it
+# solved its board, the seconds it took and the totals from before it.
+def record_call(function, engine, solved, seconds, before):
+    elapsed = seconds * 1000
+    calls.append({
+        "function": function,
+        "engine": engine,
+        "solved": solved,
+        "ms": elapsed,
+        "nodes": totals["nodes"] - before["nodes"],
+        "dead_ends": totals["dead_ends"] - before["dead_ends"],
+        "valid_calls": totals["valid_calls"] - before["valid_calls"],
+        "max_depth": totals["max_depth"],
+    })
+    totals["max_depth"] = max(totals["max_depth"], before["max_depth"])
+    totals["solve_calls"] += 1
+    totals["solve_ms"] += elapsed
+
+
+# Records how long a game frame spent in redraw_window() and in
+# pygame.display.update(), in seconds.
+def record_frame(redraw, update):
+    redraw *= 1000
+    update *= 1000
+    frames["count"] += 1
+    frames["redraw_ms"] += redraw
+    frames["update_ms"] += update
+    frames["max_redraw_ms"] = max(frames["max_redraw_ms"], redraw)
+    frames["max_update_ms"] = max(frames["max_update_ms"], update)
+    frames["last_redraw_ms"] = redraw
+    frames["last_update_ms"] = update
+
+
+# Returns the counters as a dict that can be saved as JSON.
+def report():
+    return {"enabled": enabled, "search": dict(totals), "solve_calls": list(calls), "frames": dict(frames)}
+
+
+# Saves the report as JSON.
+def save_report(path=REPORT_PATH):
+    with open(path, "w") as file:
+        json.dump(report(), file, indent=2)
+
+
+reset()
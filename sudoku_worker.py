@@ -0,0 +1,109 @@
+# sudoku_worker.py
+
+# Solver work off the game's frame loop. A SolverJob runs a search on a
+# thread of its own and sends its progress and result back through a queue,
+# so the window keeps drawing and handling input however long the search
+# takes, and the job can be cancelled or given a time budget.
+import queue
+import threading
+import time
+
+import sudoku_stats
+from sudoku_core import DEADLINE_CHECK_NODES, generate_puzzle, iter_solutions, seeded_puzzle
+
+# Constants
+# Kinds of message a job puts on its queue. PROGRESS comes with the number
+# of search steps taken so far, the others end the job and come with its
+# result (None unless DONE, the exception the task raised for FAILED).
+PROGRESS = "progress"
+DONE = "done"
+CANCELLED = "cancelled"
+TIMED_OUT = "timed out"
+FAILED = "failed"
+
+
+# SolverJob runs task(*args, stop=job) on a daemon thread. The task hands
+# the job to the search as its stop flag, which the search looks at every
+# DEADLINE_CHECK_NODES steps: that's where the job counts progress, and
+# where it tells the search to give up once cancelled or out of time.
+class SolverJob:
+    def __init__(self, task, *args, time_budget=None):
+        self.task = task
+        self.args = args
+        self.time_budget = time_budget
+        # self.messages carries (kind, value) messages to the game, see PROGRESS.
+        self.messages = queue.Queue()
+        self.cancelled = threading.Event()
+        # self.steps counts the search steps taken, roughly.
+        self.steps = 0
+        self.started = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    # Starts the job. Returns the job, so it can be started as it's made.
+    def start(self):
+        self.started = time.monotonic()
+        self.thread.start()
+        return self
+
+    # Asks the job to stop. The search gives up at its next check, and the
+    # job ends with CANCELLED.
+    def cancel(self):
+        self.cancelled.set()
+
+    # Returns the seconds the job has been running for.
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    # Tells whether the job is out of time.
+    def timed_out(self):
+        return self.time_budget is not None and self.elapsed() > self.time_budget
+
+    # Stop flag for the search, see SolverJob.
+    def is_set(self):
+        self.steps += DEADLINE_CHECK_NODES
+        self.messages.put((PROGRESS, self.steps))
+        return self.cancelled.is_set() or self.timed_out()
+
+    # Worker thread: runs the task and sends its result. The game's searches
+    # run here, so they're counted by sudoku_stats like its own. A task that
+    # raises ends the job with FAILED, so the game never waits on it forever.
+    def run(self):
+        sudoku_stats.count_thread()
+        try:
+            result = self.task(*self.args, stop=self)
+        except Exception as error:
+            self.messages.put((FAILED, error))
+            return
+        finally:
+            sudoku_stats.uncount_thread()
+        if self.cancelled.is_set():
+            self.messages.put((CANCELLED, None))
+        elif result is None and self.timed_out():
+            self.messages.put((TIMED_OUT, None))
+        else:
+            self.messages.put((DONE, result))
+
+    # Returns the messages sent since the last call, oldest first, without waiting.
+    def poll(self):
+        messages = []
+        while True:
+            try:
+                messages.append(self.messages.get_nowait())
+            except queue.Empty:
+                return messages
+
+
+# Task: returns a solution of the board as a new 2-D list, or None if it has
+# none or the search was stopped first.
+def find_solution(board, stop=None):
+    return next(iter_solutions(board, 1, stop=stop), None)
+
+
+# Task: returns a new (board, solution) puzzle like generate_puzzle(), or
+# given a seed, seeded_puzzle() for it, which only has to generate the base
+# puzzle the first time. Generation can't be stopped part way through, so a
+# cancelled job carries on in the background and its puzzle is thrown away.
+def new_puzzle(clues, size, seed=None, stop=None):
+    if seed is not None:
+        return seeded_puzzle(seed, clues, size)
+    return generate_puzzle(clues, size)
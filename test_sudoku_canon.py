@@ -0,0 +1,68 @@
+# test_sudoku_canon.py
+
+# Checks that canonical forms don't depend on which equivalent copy of a
+# puzzle, or complete grid, they're worked out from, and that solutions map
+# back through them.
+# Run with: python -m unittest test_sudoku_canon
+import unittest
+from random import Random
+
+from sudoku_core import generate_puzzle, transform_puzzle
+from sudoku_canon import apply_transform, canonical_form, canonical_key, cached_solve, clear_cache, undo_transform
+
+# Constants
+# Seeds the puzzles are generated from, and copies made of each.
+SEEDS = range(8)
+COPIES = 6
+# Complete grids tested, and copies made of each, fewer since each takes a
+# tenth of a second or so.
+GRIDS = 3
+GRID_COPIES = 2
+
+
+class CanonicalFormTest(unittest.TestCase):
+    def setUp(self):
+        clear_cache()
+
+    # Returns the (board, solution) puzzles tested, a few for each difficulty.
+    def puzzles(self):
+        for seed in SEEDS:
+            yield generate_puzzle((25, 35, 45)[seed % 3], 9, Random(seed))
+
+    def test_copies_share_canonical_form(self):
+        for seed, (board, solution) in enumerate(self.puzzles()):
+            canonical, _ = canonical_form(board)
+            rng = Random(seed)
+            for _ in range(COPIES):
+                copy, _ = transform_puzzle(board, solution, rng)
+                self.assertEqual(canonical_form(copy)[0], canonical)
+                self.assertEqual(canonical_key(copy), canonical_key(board))
+
+    def test_transform_turns_board_into_canonical_form(self):
+        for board, _ in self.puzzles():
+            canonical, transform = canonical_form(board)
+            self.assertEqual(apply_transform(board, transform), canonical)
+            self.assertEqual(undo_transform(canonical, transform), board)
+
+    def test_complete_grids_have_canonical_form(self):
+        for seed, (_, solution) in zip(range(GRIDS), self.puzzles()):
+            canonical, transform = canonical_form(solution)
+            self.assertEqual(canonical[0], list(range(1, 10)))
+            self.assertEqual(apply_transform(solution, transform), canonical)
+            rng = Random(seed)
+            for _ in range(GRID_COPIES):
+                copy, _ = transform_puzzle(solution, solution, rng)
+                self.assertEqual(canonical_form(copy)[0], canonical)
+
+    def test_solution_maps_back_to_each_copy(self):
+        for seed, (board, solution) in enumerate(self.puzzles()):
+            rng = Random(seed)
+            for _ in range(COPIES):
+                copy, copy_solution = transform_puzzle(board, solution, rng)
+                attempt = [row[:] for row in copy]
+                self.assertTrue(cached_solve(attempt))
+                self.assertEqual(attempt, copy_solution)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,141 @@
+# test_sudoku_core.py
+
+# Checks that moves on a Grid keep its board, cells and count of filled cells
+# in step through place(), undo() and redo(), and that a game comes back
+# the same from a snapshot, and that iter_solutions() tells a search cut
+# short by its time budget from one that ran out of solutions.
+# Run with: python -m unittest test_sudoku_core
+import unittest
+from random import Random
+
+from sudoku_core import ENGINES, Grid, generate_puzzle, iter_solutions
+
+# Constants
+# Seed the puzzle is generated from, its clues and the moves made on it.
+SEED = 7
+CLUES = 35
+MOVES = 10
+# Pixel size of the grids, which the tests never draw.
+WIDTH = HEIGHT = 540
+
+
+class GridMovesTest(unittest.TestCase):
+    def setUp(self):
+        self.puzzle = generate_puzzle(CLUES, 9, Random(SEED))
+        self.grid = Grid(9, 9, WIDTH, HEIGHT, CLUES, self.puzzle)
+
+    # Places the solution's number in the first MOVES empty cells, returning
+    # the (row, col) of each.
+    def place_moves(self):
+        grid = self.grid
+        empty = [(row, col) for row in range(9) for col in range(9) if grid.board[row, col] == 0][:MOVES]
+        for row, col in empty:
+            grid.select(row, col)
+            self.assertTrue(grid.place(grid.solution[row, col]))
+        return empty
+
+    # Checks that the cells show the board and the count matches it.
+    def assert_in_step(self):
+        grid = self.grid
+        for row in range(9):
+            for col in range(9):
+                self.assertEqual(grid.cells[row][col].value, grid.board[row, col])
+        self.assertEqual(grid.currently_filled, grid.board.filled())
+
+    def test_place_counts_filled_cells(self):
+        start = self.grid.currently_filled
+        self.place_moves()
+        self.assertEqual(self.grid.currently_filled, start + MOVES)
+        self.assert_in_step()
+
+    def test_wrong_number_is_not_placed(self):
+        grid = self.grid
+        row, col = next((row, col) for row in range(9) for col in range(9) if grid.board[row, col] == 0)
+        grid.select(row, col)
+        wrong = grid.solution[row, col] % 9 + 1
+        self.assertFalse(grid.place(wrong))
+        self.assertEqual(grid.board[row, col], 0)
+        self.assert_in_step()
+
+    def test_undo_and_redo_round_trip(self):
+        grid = self.grid
+        before = grid.board.copy()
+        candidates = list(grid.candidates)
+        moves = self.place_moves()
+        after = grid.board.copy()
+        after_candidates = list(grid.candidates)
+
+        for row, col in reversed(moves):
+            self.assertEqual(grid.undo(), (row, col))
+        self.assertIsNone(grid.undo())
+        self.assertEqual(grid.board, before)
+        self.assertEqual(grid.candidates, candidates)
+        self.assert_in_step()
+
+        for row, col in moves:
+            self.assertEqual(grid.redo(), (row, col))
+        self.assertIsNone(grid.redo())
+        self.assertEqual(grid.board, after)
+        self.assertEqual(grid.candidates, after_candidates)
+        self.assert_in_step()
+
+    def test_new_move_clears_redo(self):
+        grid = self.grid
+        moves = self.place_moves()
+        grid.undo()
+        grid.undo()
+        row, col = moves[-2]
+        grid.select(row, col)
+        self.assertTrue(grid.place(grid.solution[row, col]))
+        self.assertIsNone(grid.redo())
+        self.assert_in_step()
+
+    def test_snapshot_round_trip(self):
+        self.place_moves()
+        grid = self.grid
+        restored, elapsed, errors = Grid.from_snapshot(grid.to_snapshot(95.5, 3), WIDTH, HEIGHT)
+        self.assertEqual((elapsed, errors), (95.5, 3))
+        self.assertEqual(restored.board, grid.board)
+        self.assertEqual(restored.solution, grid.solution)
+        self.assertEqual(restored.givens, grid.givens)
+        self.assertEqual(restored.unique, grid.unique)
+        self.assertEqual(restored.currently_filled, grid.currently_filled)
+        self.assertEqual(restored.candidates, grid.candidates)
+
+    def test_snapshot_keeps_seed(self):
+        grid = Grid(9, 9, WIDTH, HEIGHT, CLUES, self.puzzle, seed=SEED)
+        restored, _, _ = Grid.from_snapshot(grid.to_snapshot(0, 0), WIDTH, HEIGHT)
+        self.assertEqual(restored.seed, SEED)
+        self.assertIsNone(Grid.from_snapshot(self.grid.to_snapshot(0, 0), WIDTH, HEIGHT)[0].seed)
+
+    def test_bad_snapshot_is_rejected(self):
+        data = self.grid.to_snapshot(0, 0)
+        with self.assertRaises(ValueError):
+            Grid.from_snapshot(b"XXXX" + data[4:], WIDTH, HEIGHT)
+        with self.assertRaises(ValueError):
+            Grid.from_snapshot(data[:-1], WIDTH, HEIGHT)
+
+
+class IterSolutionsTest(unittest.TestCase):
+    def test_cut_short_at_time_budget(self):
+        for engine in ENGINES:
+            search = iter_solutions([[0] * 9 for _ in range(9)], None, 0.01, engine)
+            self.assertGreater(sum(1 for _ in search), 0)
+            self.assertTrue(search.cut_short)
+
+    def test_not_cut_short_at_max_solutions(self):
+        for engine in ENGINES:
+            search = iter_solutions([[0] * 9 for _ in range(9)], 5, 60, engine)
+            self.assertEqual(sum(1 for _ in search), 5)
+            self.assertFalse(search.cut_short)
+
+    def test_not_cut_short_when_all_found(self):
+        board, solution = generate_puzzle(CLUES, 9, Random(SEED))
+        for engine in ENGINES:
+            search = iter_solutions(board, None, 60, engine)
+            self.assertEqual(list(search), [solution])
+            self.assertFalse(search.cut_short)
+
+
+if __name__ == "__main__":
+    unittest.main()